@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,15 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache(tmp_path_factory):
+    """Кеш тестов — во временном каталоге, а не в файле сайта."""
+    from django.test import override_settings
+
+    from core.test_runner import isolated_caches
+
+    directory = tmp_path_factory.mktemp('cache')
+    with override_settings(CACHES=isolated_caches(str(directory))):
+        yield
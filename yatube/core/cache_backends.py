@@ -0,0 +1,291 @@
+"""Кеш-бэкенд на SQLite в режиме WAL.
+
+Все процессы-воркеры одного хоста работают с одним файлом, поэтому
+инвалидация в одном процессе сразу видна остальным. Объём кеша
+ограничен числом записей (MAX_ENTRIES) и размером в байтах (MAX_BYTES),
+лишнее вытесняется по давности последнего чтения (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .sqlite import chunks
+
+# Время последнего чтения обновляется не чаще раза в секунду,
+# чтобы горячие ключи не превращали каждое чтение в запись.
+LRU_RESOLUTION = 1.0
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entries ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_entries_accessed'
+    ' ON cache_entries (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_entries_expires'
+    ' ON cache_entries (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL,'
+    ' bytes INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_entries_insert'
+    ' AFTER INSERT ON cache_entries BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1,'
+    ' bytes = bytes + NEW.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_entries_delete'
+    ' AFTER DELETE ON cache_entries BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1,'
+    ' bytes = bytes - OLD.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_entries_update'
+    ' AFTER UPDATE OF size ON cache_entries BEGIN'
+    ' UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size; END',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для процессов одного хоста.
+
+    LOCATION — путь к файлу базы. В OPTIONS дополнительно к стандартным
+    MAX_ENTRIES и CULL_FREQUENCY принимается MAX_BYTES.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса:
+        # после fork унаследованное соединение использовать нельзя.
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=self._busy_timeout, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        with self._transaction() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._local.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _db_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _store(self, connection, key, value, timeout, now):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(
+            'INSERT INTO cache_entries (key, value, expires, accessed, size)'
+            ' VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET'
+            ' value = excluded.value, expires = excluded.expires,'
+            ' accessed = excluded.accessed, size = excluded.size',
+            (key, blob, self.get_backend_timeout(timeout), now, len(blob)),
+        )
+
+    def _cull(self, connection, now):
+        entries, size = connection.execute(
+            'SELECT entries, bytes FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_bytes:
+            return
+        connection.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (now,)
+        )
+        if self._cull_frequency == 0:
+            entries, size = connection.execute(
+                'SELECT entries, bytes FROM cache_stats'
+            ).fetchone()
+            if entries > self._max_entries or size > self._max_bytes:
+                connection.execute('DELETE FROM cache_entries')
+            return
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, bytes FROM cache_stats'
+            ).fetchone()
+            if entries <= self._max_entries and size <= self._max_bytes:
+                return
+            connection.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                ' SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)',
+                (max(1, entries // self._cull_frequency),),
+            )
+
+    def _fetch(self, keys):
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        expired = []
+        touched = []
+        for chunk in chunks(keys):
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed FROM cache_entries'
+                ' WHERE key IN (%s)' % ', '.join('?' * len(chunk)),
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    expired.append(key)
+                    continue
+                found[key] = pickle.loads(value)
+                if now - accessed > LRU_RESOLUTION:
+                    touched.append(key)
+        if expired or touched:
+            with self._transaction() as connection:
+                for chunk in chunks(expired):
+                    connection.execute(
+                        'DELETE FROM cache_entries WHERE expires <= ?'
+                        ' AND key IN (%s)' % ', '.join('?' * len(chunk)),
+                        [now, *chunk],
+                    )
+                for chunk in chunks(touched):
+                    connection.execute(
+                        'UPDATE cache_entries SET accessed = ?'
+                        ' WHERE key IN (%s)' % ', '.join('?' * len(chunk)),
+                        [now, *chunk],
+                    )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._db_key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        db_keys = {self._db_key(key, version): key for key in keys}
+        return {
+            db_keys[key]: value
+            for key, value in self._fetch(list(db_keys)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._db_key(key, version)
+        self._connection()
+        now = time.time()
+        with self._transaction() as connection:
+            self._store(connection, key, value, timeout, now)
+            self._cull(connection, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = [
+            (self._db_key(key, version), value) for key, value in data.items()
+        ]
+        self._connection()
+        now = time.time()
+        with self._transaction() as connection:
+            for key, value in items:
+                self._store(connection, key, value, timeout, now)
+            self._cull(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._db_key(key, version)
+        self._connection()
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and (row[0] is None or row[0] > now):
+                return False
+            self._store(connection, key, value, timeout, now)
+            self._cull(connection, now)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно увеличивает значение: чтение и запись идут под одной
+        блокировкой записи SQLite (BEGIN IMMEDIATE)."""
+        db_key = self._db_key(key, version)
+        self._connection()
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?',
+                (db_key,),
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache_entries SET value = ?, size = ?, accessed = ?'
+                ' WHERE key = ?',
+                (blob, len(blob), now, db_key),
+            )
+        return new_value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._db_key(key, version)
+        self._connection()
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache_entries SET expires = ?, accessed = ?'
+                ' WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now),
+            )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self._db_key(key, version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self._db_key(key, version)
+        self._connection()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'DELETE FROM cache_entries WHERE key = ?', (key,)
+            )
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        db_keys = [self._db_key(key, version) for key in keys]
+        self._connection()
+        with self._transaction() as connection:
+            for chunk in chunks(db_keys):
+                connection.execute(
+                    'DELETE FROM cache_entries WHERE key IN (%s)'
+                    % ', '.join('?' * len(chunk)),
+                    chunk,
+                )
+
+    def clear(self):
+        self._connection()
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache_entries')
@@ -0,0 +1,9 @@
+def query_budget(max_queries):
+    """Объявляет максимальное число SQL-запросов для view-функции.
+
+    Бюджет проверяет core.middleware.QueryBudgetMiddleware.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
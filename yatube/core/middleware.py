@@ -0,0 +1,46 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы view и сверяет их с бюджетом из @query_budget.
+
+    При превышении пишет предупреждение в лог, а при
+    QUERY_BUDGET_RAISE = True выбрасывает QueryBudgetExceeded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        request.query_count = 0
+
+        def count_queries(execute, sql, params, many, context):
+            if request.query_budget is not None:
+                request.query_count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        budget = request.query_budget
+        if budget is not None and request.query_count > budget:
+            message = (
+                f'{request.path}: {request.query_count} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,44 @@
+"""Общее для раздачи файлов с диска: статики (core.staticfiles)
+и картинок постов (posts.serving)."""
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+
+# Для файлов, чьё имя меняется вместе с содержимым.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=3600'
+
+
+def resolve(root, path):
+    """(имя относительно root, полный путь) для path из URL.
+
+    Http404 для путей вне root и неканонических путей (posts/../x).
+    """
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    name = os.path.relpath(full_path, root).replace(os.sep, '/')
+    if name != path:
+        raise Http404
+    return name, full_path
+
+
+def file_validators(stat, *variant):
+    """ETag и Last-Modified файла по os.stat; variant отличает разные
+    представления одного файла (например, кодировку)."""
+    etag = quote_etag('-'.join(filter(None, (
+        f'{stat.st_mtime_ns:x}', f'{stat.st_size:x}', *variant
+    ))))
+    return etag, int(stat.st_mtime)
+
+
+def set_cache_headers(response, etag, last_modified, immutable):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if immutable else CACHE_CONTROL
+    )
@@ -0,0 +1,9 @@
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_QUERY_PARAMS = 500
+
+
+def chunks(items, size=MAX_QUERY_PARAMS):
+    """Части items не длиннее size: по одному запросу на часть."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
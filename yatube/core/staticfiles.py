@@ -0,0 +1,150 @@
+"""Статика с хешами в именах и заранее сжатыми копиями.
+
+collectstatic через CompressedManifestStaticFilesStorage пишет файлы
+с хешем содержимого в имени, как ManifestStaticFilesStorage, а рядом
+с текстовыми файлами — копии .gz и, если установлен пакет brotli, .br.
+{% static %} ссылается на имя с хешем, поэтому такие файлы кешируются
+навсегда. serve_static отдаёт статику при DEBUG = False и выбирает
+готовую сжатую копию по Accept-Encoding, ничего не сжимая на лету.
+"""
+import gzip
+import io
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotAllowed
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .decorators import query_budget
+from .serving import file_validators, resolve, set_cache_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.map', '.svg', '.ico', '.json', '.txt', '.html',
+    '.xml', '.ttf', '.eot',
+}
+# Кодировки в порядке предпочтения и расширения их копий.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Имя с хешем от ManifestStaticFilesStorage: bootstrap.min.1a2b3c4d5e6f.css.
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^.]+$')
+
+
+def gzip_compress(data):
+    # gzip.compress принимает mtime только с Python 3.8; без mtime
+    # в заголовке было бы время сборки и копии отличались бы.
+    buffer = io.BytesIO()
+    with gzip.GzipFile(
+        fileobj=buffer, mode='wb', compresslevel=9, mtime=0
+    ) as compressed:
+        compressed.write(data)
+    return buffer.getvalue()
+
+
+def compressors():
+    """Пары (расширение, функция сжатия) для доступных кодировок."""
+    available = {'.gz': gzip_compress}
+    if brotli is not None:
+        available['.br'] = brotli.compress
+    return [
+        (extension, available[extension])
+        for _, extension in ENCODINGS if extension in available
+    ]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет в STATIC_ROOT: collectstatic ещё не запускали
+            # (тесты, локальный запуск без DEBUG). Ссылка — без хеша.
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            extension = os.path.splitext(name)[1].lower()
+            if extension in COMPRESSIBLE_EXTENSIONS:
+                self.compress(name)
+
+    def compress(self, name):
+        """Пишет сжатые копии name, если они меньше оригинала."""
+        with self.open(name) as original:
+            data = original.read()
+        for extension, compress in compressors():
+            compressed_name = name + extension
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                self._save(compressed_name, ContentFile(compressed))
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+@query_budget(0)
+def serve_static(request, path):
+    """Отдаёт файл STATIC_ROOT/path, сжатый заранее, если клиент
+    принимает такую кодировку."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    name, full_path = resolve(settings.STATIC_ROOT, path)
+    if not os.path.isfile(full_path):
+        raise Http404
+    accepted = accepted_encodings(request)
+    encoding, served_path = None, full_path
+    for coding, extension in ENCODINGS:
+        if (coding in accepted or '*' in accepted) and os.path.isfile(
+            full_path + extension
+        ):
+            encoding, served_path = coding, full_path + extension
+            break
+    # У каждой кодировки свой ETag: это разные представления.
+    etag, last_modified = file_validators(os.stat(served_path), encoding)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = FileResponse(
+            open(served_path, 'rb'),
+            content_type=(
+                mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            ),
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    set_cache_headers(
+        response, etag, last_modified,
+        immutable=HASHED_NAME_RE.search(name) is not None,
+    )
+    return response
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def isolated_caches(directory):
+    """CACHES, в которых файлы всех кешей лежат в каталоге directory."""
+    return {
+        alias: {
+            **config,
+            'LOCATION': os.path.join(directory, f'{alias}.sqlite3'),
+        }
+        for alias, config in settings.CACHES.items()
+    }
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с QUERY_BUDGET_RAISE = True: view, превысивший
+    бюджет @query_budget, роняет тест, а не только пишет в лог.
+
+    Кеш на время прогона переносится во временный каталог, чтобы тесты
+    не делили его с запущенным сайтом и с параллельными прогонами.
+    Для py.test то же делает фикстура в tests/conftest.py.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp(prefix='yatube-cache-')
+        self.test_settings = override_settings(
+            QUERY_BUDGET_RAISE=True,
+            CACHES=isolated_caches(self.cache_directory),
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
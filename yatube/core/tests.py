@@ -0,0 +1,189 @@
+import gzip
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import SQLiteCache
+from core.staticfiles import brotli
+
+
+def make_cache(location, **options):
+    return SQLiteCache(location, {'OPTIONS': options})
+
+
+def increment_many(location, times):
+    cache = make_cache(location)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = make_cache(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        """Базовые операции совпадают с контрактом кеша Django."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertTrue(self.cache.has_key('key'))
+        self.assertEqual(self.cache.get_many(['key', 'missing']), {
+            'key': {'value': [1, 2]}
+        })
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_expiration_and_add(self):
+        """Просроченная запись не отдаётся, и add может её заменить."""
+        self.cache.set('key', 'old', timeout=0.01)
+        self.assertTrue(self.cache.add('other', 'value'))
+        self.assertFalse(self.cache.add('other', 'new'))
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr меняет число и падает на отсутствующем ключе."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Процессы делят один кеш и не теряют инкременты."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(
+                target=increment_many, args=(self.location, 50)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_tests_use_own_cache_file(self):
+        """Тесты не пишут в файл кеша запущенного сайта."""
+        self.assertNotEqual(
+            cache._path,
+            os.path.join(settings.BASE_DIR, 'cache', 'cache.sqlite3')
+        )
+        self.assertTrue(cache._path.startswith(tempfile.gettempdir()))
+
+    def test_lru_eviction_by_size(self):
+        """При превышении MAX_BYTES вытесняются давно читанные записи."""
+        cache = make_cache(self.location, MAX_BYTES=3000, CULL_FREQUENCY=4)
+        payload = 'x' * 900
+        cache.set('first', payload)
+        cache.set('second', payload)
+        connection = cache._connection()
+        connection.execute(
+            "UPDATE cache_entries SET accessed = 0 WHERE key LIKE '%first'"
+        )
+        cache.get('second')
+        cache.set('third', payload)
+        cache.set('fourth', payload)
+        self.assertIsNone(cache.get('first'))
+        self.assertEqual(cache.get('fourth'), payload)
+        size = connection.execute('SELECT bytes FROM cache_stats').fetchone()
+        self.assertLessEqual(size[0], 3000)
+
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(STATIC_ROOT=TEMP_STATIC_ROOT)
+class StaticFilesTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name('css/bootstrap.min.css')
+        cls.url = staticfiles_storage.url('css/bootstrap.min.css')
+        with open(finders.find('css/bootstrap.min.css'), 'rb') as original:
+            cls.original = original.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def test_collectstatic_writes_hashed_compressed_copies(self):
+        self.assertRegex(
+            self.hashed, r'^css/bootstrap\.min\.[0-9a-f]{12}\.css$'
+        )
+        self.assertEqual(self.url, f'/static/{self.hashed}')
+        with staticfiles_storage.open(self.hashed + '.gz') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), self.original)
+        self.assertEqual(
+            staticfiles_storage.exists(self.hashed + '.br'), brotli is not None
+        )
+
+    def test_static_tag_uses_hashed_name(self):
+        rendered = Template(
+            "{% load static %}{% static 'css/bootstrap.min.css' %}"
+        ).render(Context())
+        self.assertEqual(rendered, self.url)
+
+    def test_serves_precompressed_copy(self):
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING='gzip, deflate, br;q=0'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            self.original,
+        )
+
+    def test_identity_when_encoding_not_accepted(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.original)
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_name_is_not_immutable(self):
+        response = self.client.get('/static/css/bootstrap.min.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_missing_file(self):
+        for path in ('/static/css/missing.css', '/static/../manage.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+
+class StaticFilesWithoutCollectTests(SimpleTestCase):
+    def test_unhashed_url_before_collectstatic(self):
+        """Без collectstatic {% static %} ссылается на имя без хеша."""
+        with tempfile.TemporaryDirectory() as static_root, \
+                override_settings(STATIC_ROOT=static_root):
+            self.assertEqual(
+                staticfiles_storage.url('css/bootstrap.min.css'),
+                '/static/css/bootstrap.min.css',
+            )
@@ -0,0 +1,285 @@
+"""JSON API только для чтения: посты, группы, профили, комментарии
+и лента подписок.
+
+Ответ собирается из строк values() без создания моделей. Параметр
+?fields=id,text оставляет в ответе только перечисленные поля, и в SELECT
+попадают только их столбцы (плюс ключи курсора и тегов кеша). Списки
+листаются курсором ?after=/?before= из ссылок next/previous.
+"""
+from functools import wraps
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import JsonResponse
+
+from core.decorators import query_budget
+
+from . import conditional
+from .caching import anonymous_page_cache, tag_post_rows, tag_request
+from .models import Comment, Group, Post, TimelineEntry, User
+from .paginators import CursorPaginator
+from .storage import post_images
+
+API_PAGE_SIZE = 20
+
+POST_FIELDS = {
+    'id': 'pk',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated_at': 'updated_at',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+# Ключи для тегов кеша: выбираются всегда, даже если их нет в fields.
+POST_KEYS = ('pk', 'author_id', 'group_id')
+TIMELINE_FIELDS = {
+    name: 'post_id' if lookup == 'pk' else f'post__{lookup}'
+    for name, lookup in POST_FIELDS.items()
+}
+GROUP_FIELDS = {
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+}
+PROFILE_FIELDS = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'stats__posts_count',
+    'followers_count': 'stats__followers_count',
+    'following_count': 'stats__following_count',
+}
+COMMENT_FIELDS = {
+    'id': 'pk',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+def image_url(name):
+    return post_images.url(name) if name else None
+
+
+CONVERTERS = {'image': image_url}
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def api_response(payload, status=200):
+    return JsonResponse(
+        payload, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def api_view(view_func):
+    """Отвечает на ошибки API и отсутствующие объекты JSON-ом."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return api_response(
+                {'detail': 'API доступно только для чтения.'}, status=405
+            )
+        try:
+            return view_func(request, *args, **kwargs)
+        except ApiError as error:
+            return api_response({'detail': error.detail}, error.status)
+        except ObjectDoesNotExist:
+            return api_response({'detail': 'Не найдено.'}, status=404)
+    return wrapper
+
+
+def api_login_required(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            raise ApiError(401, 'Нужна авторизация.')
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def requested_fields(request, fields):
+    """Поля из ?fields=, по умолчанию — все поля ресурса."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return tuple(fields)
+    names = tuple(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()
+    ))
+    unknown = [name for name in names if name not in fields]
+    if unknown or not names:
+        raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}.')
+    return names
+
+
+def lookups(fields, names, *keys):
+    """Аргументы для values(): столбцы запрошенных полей и ключи."""
+    return tuple(dict.fromkeys([fields[name] for name in names] + list(keys)))
+
+
+def serialize(row, fields, names):
+    return {
+        name: CONVERTERS[name](row[fields[name]])
+        if name in CONVERTERS else row[fields[name]]
+        for name in names
+    }
+
+
+def _page_url(request, param, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    query[param] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def get_page(request, queryset, fields, names,
+             ordering=('-pub_date', '-pk'), keys=()):
+    """Страница строк values() по курсору и её JSON-представление."""
+    cursor_fields = [name.lstrip('-') for name in ordering]
+    rows = queryset.values(*lookups(fields, names, *cursor_fields, *keys))
+    paginator = CursorPaginator(
+        rows, API_PAGE_SIZE, ordering=ordering, page_numbers=False
+    )
+    page = paginator.get_page(
+        after=request.GET.get('after'), before=request.GET.get('before')
+    )
+    payload = {
+        'results': [serialize(row, fields, names) for row in page],
+        'next': _page_url(request, 'after', page.next_cursor),
+        'previous': _page_url(request, 'before', page.previous_cursor),
+    }
+    return page, payload
+
+
+def posts_response(request, queryset):
+    names = requested_fields(request, POST_FIELDS)
+    page, payload = get_page(
+        request, queryset, POST_FIELDS, names, keys=POST_KEYS
+    )
+    tag_post_rows(request, page)
+    return api_response(payload)
+
+
+@query_budget(4)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.index_state)
+def post_list(request):
+    tag_request(request, 'feed')
+    return posts_response(request, Post.objects.all())
+
+
+@query_budget(5)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.post_state)
+def post_detail(request, post_id):
+    names = requested_fields(request, POST_FIELDS)
+    row = Post.objects.values(
+        *lookups(POST_FIELDS, names, *POST_KEYS)
+    ).get(pk=post_id)
+    tag_post_rows(request, [row])
+    return api_response(serialize(row, POST_FIELDS, names))
+
+
+@query_budget(5)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.post_state)
+def post_comments(request, post_id):
+    names = requested_fields(request, COMMENT_FIELDS)
+    page, payload = get_page(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS,
+        names,
+        ordering=('created', 'pk'),
+    )
+    if not page.object_list and not Post.objects.filter(pk=post_id).exists():
+        raise Post.DoesNotExist
+    tag_request(request, f'post:{post_id}')
+    return api_response(payload)
+
+
+@query_budget(3)
+@api_view
+def group_list(request):
+    names = requested_fields(request, GROUP_FIELDS)
+    _, payload = get_page(
+        request, Group.objects.all(), GROUP_FIELDS, names, ordering=('slug',)
+    )
+    return api_response(payload)
+
+
+@query_budget(5)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.group_state)
+def group_detail(request, slug):
+    names = requested_fields(request, GROUP_FIELDS)
+    row = Group.objects.values(
+        *lookups(GROUP_FIELDS, names, 'pk')
+    ).get(slug=slug)
+    tag_request(request, f'group:{row["pk"]}')
+    return api_response(serialize(row, GROUP_FIELDS, names))
+
+
+@query_budget(6)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.group_state)
+def group_posts(request, slug):
+    group_id = Group.objects.values_list('pk', flat=True).get(slug=slug)
+    tag_request(request, f'group:{group_id}')
+    return posts_response(request, Post.objects.filter(group_id=group_id))
+
+
+@query_budget(6)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.profile_state)
+def profile_detail(request, username):
+    names = requested_fields(request, PROFILE_FIELDS)
+    row = User.objects.values(
+        *lookups(PROFILE_FIELDS, names, 'pk')
+    ).get(username=username)
+    tag_request(request, f'author:{row["pk"]}')
+    return api_response(serialize(row, PROFILE_FIELDS, names))
+
+
+@query_budget(7)
+@anonymous_page_cache
+@api_view
+@conditional.conditional_view(conditional.profile_state)
+def profile_posts(request, username):
+    author_id = User.objects.values_list('pk', flat=True).get(
+        username=username
+    )
+    tag_request(request, f'author:{author_id}')
+    return posts_response(request, Post.objects.filter(author_id=author_id))
+
+
+@query_budget(5)
+@api_view
+@api_login_required
+@conditional.conditional_view(conditional.follow_state)
+def follow_posts(request):
+    names = requested_fields(request, TIMELINE_FIELDS)
+    _, payload = get_page(
+        request,
+        TimelineEntry.objects.filter(user=request.user),
+        TIMELINE_FIELDS,
+        names,
+        ordering=('-pub_date', '-post_id'),
+    )
+    return api_response(payload)
@@ -0,0 +1,207 @@
+"""Ключи кеша лент и их инвалидация."""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+FEED_GENERATION_KEY = 'posts:feed:generation'
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+
+def count_key(feed, pk=None):
+    """Ключ закешированного числа записей ленты."""
+    return f'posts:count:{feed}' if pk is None else f'posts:count:{feed}:{pk}'
+
+
+def cached_count(key, queryset, timeout):
+    """COUNT(*) по queryset, сохранённый в кеше на timeout секунд."""
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def invalidate_counts(group_ids=(), follower_ids=()):
+    """Удаляет закешированные числа записей главной, лент групп
+    group_ids и лент подписок follower_ids."""
+    keys = [count_key('index')]
+    keys.extend(
+        count_key('group', group_id)
+        for group_id in set(group_ids) - {None}
+    )
+    keys.extend(count_key('follow', user_id) for user_id in follower_ids)
+    cache.delete_many(keys)
+
+
+def invalidate_post_counts(post, previous_group_id=None, follower_ids=()):
+    """invalidate_counts для лент поста: его группы, прежней группы,
+    если пост перенесён, и лент подписчиков follower_ids."""
+    invalidate_counts((post.group_id, previous_group_id), follower_ids)
+
+
+def _initial_generation():
+    # Если счётчик вытеснен из кеша, новое значение всё равно больше
+    # прежних, и старые фрагменты не всплывут снова.
+    return int(time.time() * 1000)
+
+
+def feed_generation():
+    """Текущее поколение лент: меняется при любом изменении постов
+    и групп и входит в ключи кеша фрагментов."""
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        cache.add(FEED_GENERATION_KEY, _initial_generation(), None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return generation
+
+
+def bump_feed_generation():
+    try:
+        return cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        cache.set(FEED_GENERATION_KEY, _initial_generation(), None)
+
+
+def tag_key(tag):
+    return f'posts:tag:{tag}'
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; отсутствующие теги получают новую версию."""
+    keys = {tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, _initial_generation(), None)
+        versions[key] = cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def purge_tags(*tags):
+    """Делает недействительными все страницы, помеченные этими тегами."""
+    for tag in set(tags):
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            cache.set(tag_key(tag), _initial_generation(), None)
+
+
+def post_tags(post):
+    tags = [f'post:{post.pk}', f'author:{post.author_id}']
+    if post.group_id is not None:
+        tags.append(f'group:{post.group_id}')
+    return tags
+
+
+def touch_posts(queryset, batch_size=500, **changes):
+    """Обновляет посты queryset пачками по batch_size вместе
+    с updated_at и делает недействительными их карточки и страницы;
+    возвращает число обновлённых постов.
+
+    От updated_at зависят ключи кеша карточек, ETag и Last-Modified
+    страниц, поэтому его меняет любое изменение, видимое в карточке.
+    """
+    rows = list(queryset.order_by().values_list(
+        'pk', 'author_id', 'group_id'
+    ))
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        queryset.model.objects.filter(
+            pk__in=[pk for pk, _, _ in batch]
+        ).update(updated_at=timezone.now(), **changes)
+        tags = {'feed'}
+        for pk, author_id, group_id in batch:
+            tags.update((f'post:{pk}', f'author:{author_id}'))
+            if group_id is not None:
+                tags.add(f'group:{group_id}')
+        purge_tags(*tags)
+    if rows:
+        bump_feed_generation()
+    return len(rows)
+
+
+def tag_request(request, *tags):
+    """Отмечает объекты, от которых зависит кешируемая страница."""
+    if getattr(request, 'cache_tags', None) is not None:
+        request.cache_tags.update(tags)
+
+
+def media_tag(name):
+    """Тег картинки name: сбрасывается, когда для неё готовы миниатюры,
+    и входит в ключи карточек с этой картинкой."""
+    return f'media:{name}'
+
+
+def tag_posts(request, posts):
+    for post in posts:
+        tag_request(request, *post_tags(post))
+        if post.image:
+            tag_request(request, media_tag(post.image.name))
+
+
+def tag_post_rows(request, rows):
+    """tag_posts для строк values() с ключами pk, author_id, group_id."""
+    for row in rows:
+        tags = [f'post:{row["pk"]}', f'author:{row["author_id"]}']
+        if row['group_id'] is not None:
+            tags.append(f'group:{row["group_id"]}')
+        tag_request(request, *tags)
+
+
+def page_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{path}'
+
+
+def anonymous_page_cache(view_func):
+    """Кеширует ответ view целиком для анонимных GET-запросов.
+
+    Запись хранит версии тегов, которыми view пометил страницу через
+    tag_request; purge_tags для любого из них делает запись устаревшей.
+    Вместе со страницей хранятся её ETag и Last-Modified, так что
+    условный запрос к закешированной странице получает 304 без SQL.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.POSTS_PAGE_CACHE_TIMEOUT
+        if (not timeout or request.method != 'GET'
+                or request.user.is_authenticated):
+            return view_func(request, *args, **kwargs)
+        key = page_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and tag_versions(entry['tags']) == entry['tags']:
+            response = HttpResponse(
+                entry['content'], content_type=entry['content_type']
+            )
+            for header, value in entry['headers'].items():
+                response[header] = value
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified')
+                ),
+                response=response,
+            )
+        request.cache_tags = set()
+        response = view_func(request, *args, **kwargs)
+        if (response.status_code == 200 and not response.streaming
+                and not response.cookies):
+            cache.set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'headers': {
+                    header: response[header]
+                    for header in VALIDATOR_HEADERS
+                    if response.has_header(header)
+                },
+                'tags': tag_versions(request.cache_tags),
+            }, timeout)
+        return response
+    return wrapper
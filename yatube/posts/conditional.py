@@ -0,0 +1,108 @@
+"""Валидаторы ETag/Last-Modified для лент и страницы поста.
+
+Состояние страницы вычисляется парой индексных запросов без рендеринга
+шаблона; если клиент прислал совпадающие валидаторы, view отвечает 304.
+"""
+import hashlib
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from .caching import cached_count, count_key, feed_generation
+from .models import Comment, Follow, Group, Post, TimelineEntry, User
+from .paginators import COUNT_CACHE_TIMEOUT
+
+
+def conditional_view(state_func):
+    """Декоратор: state_func(request, *args, **kwargs) возвращает пару
+    (время последнего изменения, кортеж значений для ETag) или None,
+    если объекта нет."""
+    def state(request, *args, **kwargs):
+        if not hasattr(request, 'conditional_state'):
+            request.conditional_state = state_func(request, *args, **kwargs)
+        return request.conditional_state
+
+    def etag(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if current is None:
+            return None
+        user_id = request.user.pk if request.user.is_authenticated else 0
+        raw = repr((request.get_full_path(), user_id, current))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        # Страница авторизованного пользователя зависит не только
+        # от данных, поэтому для неё достаточно ETag.
+        current = state(request, *args, **kwargs)
+        if current is None or request.user.is_authenticated:
+            return None
+        return current[0]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _newest(queryset, field='updated_at'):
+    return queryset.aggregate(newest=Max(field))['newest']
+
+
+def index_state(request):
+    return _newest(Post.objects.all()), (feed_generation(),)
+
+
+def group_state(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    newest = _newest(Post.objects.filter(group_id=group_id))
+    return newest, (feed_generation(),)
+
+
+def profile_state(request, username):
+    author = User.objects.filter(username=username).values(
+        'pk',
+        'first_name',
+        'last_name',
+        'stats__posts_count',
+        'stats__followers_count',
+        'stats__following_count',
+    ).first()
+    if author is None:
+        return None
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author_id=author['pk']
+        ).exists()
+    )
+    newest = _newest(Post.objects.filter(author_id=author['pk']))
+    return newest, (feed_generation(), following, *author.values())
+
+
+def post_state(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        'updated_at',
+        'comments_count',
+        'group__slug',
+        'author__first_name',
+        'author__last_name',
+        'author__stats__posts_count',
+    ).first()
+    if post is None:
+        return None
+    newest_comment = _newest(
+        Comment.objects.filter(post_id=post_id), 'created'
+    )
+    newest = max(filter(None, (post['updated_at'], newest_comment)))
+    # Поколение лент меняется и когда для картинки поста готовы
+    # миниатюры, а updated_at при этом остаётся прежним.
+    return newest, (feed_generation(), *post.values())
+
+
+def follow_state(request):
+    entries = TimelineEntry.objects.filter(user=request.user)
+    total = cached_count(
+        count_key('follow', request.user.pk), entries, COUNT_CACHE_TIMEOUT
+    )
+    return _newest(entries, 'pub_date'), (feed_generation(), total)
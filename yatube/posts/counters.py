@@ -0,0 +1,136 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарно UPDATE ... SET n = n + 1, без чтения
+текущего значения в Python.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, User, UserStats
+
+BATCH_SIZE = 500
+USER_COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def _actual_user_counts(user_ids):
+    counts = {
+        user_id: dict.fromkeys(USER_COUNTERS, 0) for user_id in user_ids
+    }
+    sources = (
+        ('posts_count', Post.objects.filter(author_id__in=user_ids),
+         'author_id'),
+        ('followers_count', Follow.objects.filter(author_id__in=user_ids),
+         'author_id'),
+        ('following_count', Follow.objects.filter(user_id__in=user_ids),
+         'user_id'),
+    )
+    for counter, queryset, key in sources:
+        rows = queryset.order_by().values(key).annotate(
+            total=Count('pk')
+        ).values_list(key, 'total')
+        for user_id, total in rows:
+            counts[user_id][counter] = total
+    return counts
+
+
+def get_user_stats(user):
+    """Возвращает счётчики пользователя, создавая их при отсутствии."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user.pk, defaults=_actual_user_counts([user.pk])[user.pk]
+        )
+        return stats
+
+
+def change_user_counter(user_id, counter, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{counter: F(counter) + delta}
+    )
+    if updated or delta < 0:
+        # Без строки уменьшать нечего: её ещё нет (get_user_stats
+        # создаст её с реальными значениями) или пользователь удаляется
+        # и UserStats уже удалена каскадом раньше его постов и подписок.
+        return
+    # Строки ещё нет: создаём её сразу с реальными значениями,
+    # которые уже учитывают текущее изменение.
+    try:
+        with transaction.atomic():
+            UserStats.objects.create(
+                user_id=user_id, **_actual_user_counts([user_id])[user_id]
+            )
+    except IntegrityError:
+        UserStats.objects.filter(user_id=user_id).update(
+            **{counter: F(counter) + delta}
+        )
+
+
+def change_comments_counter(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def _batches(queryset, batch_size):
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def reconcile_user_counters(batch_size=BATCH_SIZE):
+    """Сверяет счётчики пользователей с таблицами, возвращает число
+    исправленных строк."""
+    fixed = 0
+    for user_ids in _batches(User.objects.all(), batch_size):
+        actual = _actual_user_counts(user_ids)
+        with transaction.atomic():
+            stored = UserStats.objects.select_for_update().in_bulk(user_ids)
+            missing = [
+                UserStats(user_id=user_id, **actual[user_id])
+                for user_id in user_ids if user_id not in stored
+            ]
+            UserStats.objects.bulk_create(missing)
+            drifted = []
+            for user_id, stats in stored.items():
+                values = actual[user_id]
+                if any(getattr(stats, name) != values[name]
+                       for name in USER_COUNTERS):
+                    for name in USER_COUNTERS:
+                        setattr(stats, name, values[name])
+                    drifted.append(stats)
+            UserStats.objects.bulk_update(drifted, USER_COUNTERS)
+        fixed += len(missing) + len(drifted)
+    return fixed
+
+
+def reconcile_comment_counters(batch_size=BATCH_SIZE):
+    """Сверяет comments_count постов, возвращает число исправленных
+    строк."""
+    fixed = 0
+    for post_ids in _batches(Post.objects.all(), batch_size):
+        actual = dict(
+            Comment.objects.filter(post_id__in=post_ids).order_by().values(
+                'post_id'
+            ).annotate(total=Count('pk')).values_list('post_id', 'total')
+        )
+        with transaction.atomic():
+            posts = Post.objects.select_for_update().filter(
+                pk__in=post_ids
+            ).only('pk', 'comments_count')
+            drifted = []
+            for post in posts:
+                total = actual.get(post.pk, 0)
+                if post.comments_count != total:
+                    post.comments_count = total
+                    drifted.append(post)
+            Post.objects.bulk_update(drifted, ['comments_count'])
+        fixed += len(drifted)
+    return fixed
@@ -0,0 +1,91 @@
+"""Потоковая выгрузка постов и комментариев автора или группы.
+
+Строки читаются из базы итератором по values_list, без создания
+моделей, и сразу превращаются в JSON Lines или CSV, так что память не
+растёт с числом записей. Формат записей совпадает с тем, что принимает
+import_content.
+"""
+import csv
+import json
+
+from .models import Comment
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+POST_FIELDS = (
+    'id', 'author', 'group', 'text', 'pub_date', 'updated_at', 'image'
+)
+COMMENT_FIELDS = ('post', 'author', 'text', 'created')
+CSV_COLUMNS = ('type', *dict.fromkeys(POST_FIELDS + COMMENT_FIELDS))
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def records(posts, comments=False):
+    """Записи постов queryset posts, а за ними — их комментариев."""
+    rows = posts.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'updated_at', 'image',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for pk, author, group, text, pub_date, updated_at, image in rows:
+        yield {
+            'type': 'post',
+            'id': pk,
+            'author': author,
+            'group': group,
+            'text': text,
+            'pub_date': _isoformat(pub_date),
+            'updated_at': _isoformat(updated_at),
+            'image': image or None,
+        }
+    if not comments:
+        return
+    rows = Comment.objects.filter(
+        post__in=posts.order_by().values('pk')
+    ).order_by('post_id', 'created', 'pk').values_list(
+        'post_id', 'author__username', 'text', 'created'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for post_id, author, text, created in rows:
+        yield {
+            'type': 'comment',
+            'post': post_id,
+            'author': author,
+            'text': text,
+            'created': _isoformat(created),
+        }
+
+
+def to_jsonl(items):
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку, а не
+    накапливает её."""
+
+    def write(self, value):
+        return value
+
+
+def to_csv(items):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for item in items:
+        yield writer.writerow([
+            '' if item.get(column) is None else item[column]
+            for column in CSV_COLUMNS
+        ])
+
+
+SERIALIZERS = {'jsonl': to_jsonl, 'csv': to_csv}
+
+
+def export(posts, data_format='jsonl', comments=False):
+    """Поток строк выгрузки в формате data_format."""
+    return SERIALIZERS[data_format](records(posts, comments))
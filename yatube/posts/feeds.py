@@ -0,0 +1,165 @@
+"""RSS- и Atom-ленты постов: общая, группы и автора.
+
+Записи строятся из строк values() без создания моделей. Ленты кешируются
+тем же anonymous_page_cache с теми же тегами, что и HTML-ленты, и
+отвечают 304 по тем же валидаторам, поэтому опрос ленты без новых
+постов не выполняет SQL.
+"""
+from django.contrib.syndication.views import Feed
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from core.decorators import query_budget
+
+from . import conditional
+from .caching import anonymous_page_cache, tag_post_rows, tag_request
+from .models import Group, Post, User
+
+FEED_ITEMS = 20
+TITLE_WORDS = 8
+ITEM_FIELDS = (
+    'pk', 'text', 'pub_date', 'updated_at', 'author_id', 'group_id',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__title',
+)
+
+
+class PostsFeed(Feed):
+    """Общая лента: последние посты сайта."""
+    title = 'Yatube: последние обновления'
+    description = 'Последние посты на сайте Yatube'
+
+    def get_object(self, request):
+        # Feed не передаёт request в items(), а помечать страницу кеша
+        # нужно по строкам, попавшим в ленту, поэтому request едет
+        # вместе с объектом ленты.
+        return {'request': request}
+
+    def link(self, obj):
+        return reverse('posts:index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        rows = list(
+            self.posts(obj).order_by('-pub_date', '-pk').values(
+                *ITEM_FIELDS
+            )[:FEED_ITEMS]
+        )
+        tag_request(obj['request'], 'feed')
+        tag_post_rows(obj['request'], rows)
+        return rows
+
+    def item_title(self, item):
+        return Truncator(item['text']).words(TITLE_WORDS)
+
+    def item_description(self, item):
+        return item['text']
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=(item['pk'],))
+
+    def item_pubdate(self, item):
+        return item['pub_date']
+
+    def item_updateddate(self, item):
+        return item['updated_at']
+
+    def item_author_name(self, item):
+        full_name = ' '.join(filter(None, (
+            item['author__first_name'], item['author__last_name']
+        )))
+        return full_name or item['author__username']
+
+    def item_author_link(self, item):
+        return reverse('posts:profile', args=(item['author__username'],))
+
+    def item_categories(self, item):
+        if item['group__title']:
+            return (item['group__title'],)
+        return ()
+
+
+class GroupFeed(PostsFeed):
+    """Лента постов группы."""
+
+    def get_object(self, request, slug):
+        group = Group.objects.values(
+            'pk', 'slug', 'title', 'description'
+        ).get(slug=slug)
+        tag_request(request, f'group:{group["pk"]}')
+        return {'request': request, **group}
+
+    def title(self, obj):
+        return f'Yatube: {obj["title"]}'
+
+    def description(self, obj):
+        return obj['description']
+
+    def link(self, obj):
+        return reverse('posts:group_list', args=(obj['slug'],))
+
+    def posts(self, obj):
+        return Post.objects.filter(group_id=obj['pk'])
+
+
+class AuthorFeed(PostsFeed):
+    """Лента постов автора."""
+
+    def get_object(self, request, username):
+        author = User.objects.values(
+            'pk', 'username', 'first_name', 'last_name'
+        ).get(username=username)
+        tag_request(request, f'author:{author["pk"]}')
+        return {'request': request, **author}
+
+    def title(self, obj):
+        full_name = ' '.join(
+            filter(None, (obj['first_name'], obj['last_name']))
+        )
+        return f'Yatube: посты {full_name or obj["username"]}'
+
+    def description(self, obj):
+        return f'Последние посты автора {obj["username"]}'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=(obj['username'],))
+
+    def posts(self, obj):
+        return Post.objects.filter(author_id=obj['pk'])
+
+
+class AtomMixin:
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+
+class PostsAtomFeed(AtomMixin, PostsFeed):
+    pass
+
+
+class GroupAtomFeed(AtomMixin, GroupFeed):
+    pass
+
+
+class AuthorAtomFeed(AtomMixin, AuthorFeed):
+    pass
+
+
+def feed_view(feed_class, state_func, budget):
+    """Оборачивает ленту в кеш страниц и условный GET, как HTML-ленты."""
+    return query_budget(budget)(anonymous_page_cache(
+        conditional.conditional_view(state_func)(feed_class())
+    ))
+
+
+index_rss = feed_view(PostsFeed, conditional.index_state, 5)
+index_atom = feed_view(PostsAtomFeed, conditional.index_state, 5)
+group_rss = feed_view(GroupFeed, conditional.group_state, 6)
+group_atom = feed_view(GroupAtomFeed, conditional.group_state, 6)
+author_rss = feed_view(AuthorFeed, conditional.profile_state, 7)
+author_atom = feed_view(AuthorAtomFeed, conditional.profile_state, 7)
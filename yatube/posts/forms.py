@@ -1,5 +1,6 @@
 from django.forms import ModelForm
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -13,6 +14,16 @@ class PostForm(ModelForm):
             'image': 'Изображение'
         }
 
+    def __init__(self, *args, oversized=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # Поля, файлы которых отброшены при загрузке из-за размера.
+        self.oversized = oversized
+
+    def clean_image(self):
+        if 'image' in self.oversized:
+            raise uploads.oversized_error()
+        return uploads.clean_image(self.cleaned_data.get('image'))
+
 
 class CommentForm(ModelForm):
     class Meta:
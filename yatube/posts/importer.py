@@ -0,0 +1,261 @@
+"""Потоковый импорт постов, комментариев и подписок.
+
+Записи читаются из JSON Lines или CSV по одной, авторы и группы
+находятся по словарям в памяти, а в базу записи попадают пачками через
+bulk_create. Каждая пачка вместе с позицией в источнике (ImportCheckpoint)
+пишется в одной транзакции, поэтому после сбоя импорт продолжается
+с первой незаписанной пачки.
+
+bulk_create не отправляет сигналы, поэтому счётчики, ленты подписок,
+ссылки на картинки и поисковый индекс обновляются здесь же,
+в транзакции пачки.
+"""
+import csv
+import json
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, media, search_index, timeline
+from .models import Comment, Follow, Group, ImportCheckpoint, Post, User
+
+BATCH_SIZE = 1000
+RECORD_TYPES = ('post', 'comment', 'follow')
+
+
+class ImportFailed(Exception):
+    def __init__(self, position, message):
+        super().__init__(f'Запись {position}: {message}')
+        self.position = position
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        # Пустая ячейка CSV означает отсутствующее значение.
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now/auto_now_add, чтобы bulk_create записал даты
+    из источника, а не текущее время."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def _date(position, record, name, default):
+    value = record.get(name)
+    if not value:
+        return default
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ImportFailed(position, f'неверная дата {name}: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Importer:
+    """Импортирует поток записей пачками по batch_size.
+
+    Тип записи берётся из поля type, а если его нет — из default_type.
+    Поля записей:
+      post: id (необязательно), author, group, text, pub_date,
+            updated_at, image;
+      comment: post (id поста), author, text, created;
+      follow: user, author.
+    Пользователи указываются по username, группы — по slug.
+    """
+
+    def __init__(self, checkpoint, batch_size=BATCH_SIZE, default_type=None):
+        self.checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            name=checkpoint
+        )
+        self.batch_size = batch_size
+        self.default_type = default_type
+        self.users = dict(
+            User.objects.values_list('username', 'pk').iterator()
+        )
+        self.groups = dict(Group.objects.values_list('slug', 'pk').iterator())
+        self.imported = Counter()
+        self.tags = set()
+
+    def run(self, records):
+        """Импортирует записи после позиции чекпоинта; возвращает
+        Counter с числом записанных объектов каждого типа."""
+        records = islice(
+            enumerate(records, 1), self.checkpoint.position, None
+        )
+        try:
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.write(batch)
+                    self.checkpoint.position = batch[-1][0]
+                    self.checkpoint.save()
+        finally:
+            if self.tags:
+                caching.purge_tags('feed', *self.tags)
+                caching.bump_feed_generation()
+        return self.imported
+
+    def write(self, batch):
+        by_type = {record_type: [] for record_type in RECORD_TYPES}
+        for position, record in batch:
+            record_type = record.get('type', self.default_type)
+            if record_type not in by_type:
+                raise ImportFailed(
+                    position, f'неизвестный тип записи {record_type!r}'
+                )
+            by_type[record_type].append((position, record))
+        # Посты пишутся первыми: на них могут ссылаться комментарии
+        # из той же пачки.
+        self.write_posts(by_type['post'])
+        self.write_comments(by_type['comment'])
+        self.write_follows(by_type['follow'])
+
+    def _user(self, position, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise ImportFailed(position, f'нет пользователя {username!r}')
+
+    def _group(self, position, slug):
+        if not slug:
+            return None
+        try:
+            return self.groups[slug]
+        except KeyError:
+            raise ImportFailed(position, f'нет группы {slug!r}')
+
+    def write_posts(self, records):
+        if not records:
+            return
+        # SQLite не возвращает id из bulk_create, а они нужны лентам
+        # и поисковому индексу, поэтому id без источника выдаются здесь.
+        next_id = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        now = timezone.now()
+        posts = []
+        for position, record in records:
+            if record.get('id'):
+                pk = int(record['id'])
+            else:
+                pk, next_id = next_id, next_id + 1
+            pub_date = _date(position, record, 'pub_date', now)
+            posts.append(Post(
+                pk=pk,
+                author_id=self._user(position, record.get('author')),
+                group_id=self._group(position, record.get('group')),
+                text=record.get('text', ''),
+                pub_date=pub_date,
+                updated_at=_date(position, record, 'updated_at', pub_date),
+                image=record.get('image', ''),
+            ))
+        with explicit_dates(
+            Post._meta.get_field('pub_date'),
+            Post._meta.get_field('updated_at'),
+        ):
+            Post.objects.bulk_create(posts)
+        authors = Counter(post.author_id for post in posts)
+        for author_id, total in authors.items():
+            counters.change_user_counter(author_id, 'posts_count', total)
+            self.tags.add(f'author:{author_id}')
+        self.tags.update(
+            f'group:{post.group_id}' for post in posts if post.group_id
+        )
+        caching.invalidate_counts(
+            {post.group_id for post in posts}, timeline.fan_out_many(posts)
+        )
+        images = {post.image.name for post in posts} - {''}
+        if images:
+            # Число ссылок пересчитывается по постам: у нескольких постов
+            # пачки может быть одна картинка.
+            media.reconcile(images)
+        search_index.index_posts(posts)
+        self.imported['post'] += len(posts)
+
+    def write_comments(self, records):
+        if not records:
+            return
+        post_ids = set()
+        for position, record in records:
+            try:
+                post_ids.add(int(record['post']))
+            except (KeyError, TypeError, ValueError):
+                raise ImportFailed(position, 'не указан id поста')
+        existing = set(Post.objects.filter(
+            pk__in=post_ids
+        ).values_list('pk', flat=True))
+        now = timezone.now()
+        comments = []
+        for position, record in records:
+            post_id = int(record['post'])
+            if post_id not in existing:
+                raise ImportFailed(position, f'нет поста {post_id}')
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=self._user(position, record.get('author')),
+                text=record.get('text', ''),
+                created=_date(position, record, 'created', now),
+            ))
+        with explicit_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(comments)
+        for post_id, total in Counter(
+            comment.post_id for comment in comments
+        ).items():
+            counters.change_comments_counter(post_id, total)
+            self.tags.add(f'post:{post_id}')
+        self.imported['comment'] += len(comments)
+
+    def write_follows(self, records):
+        pairs = set()
+        for position, record in records:
+            user_id = self._user(position, record.get('user'))
+            author_id = self._user(position, record.get('author'))
+            if user_id != author_id:
+                pairs.add((user_id, author_id))
+        if not pairs:
+            return
+        pairs -= set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user, author_id=author) for user, author in pairs]
+        )
+        following = Counter(user_id for user_id, _ in pairs)
+        followers = Counter(author_id for _, author_id in pairs)
+        for user_id, total in following.items():
+            counters.change_user_counter(user_id, 'following_count', total)
+        for author_id, total in followers.items():
+            counters.change_user_counter(author_id, 'followers_count', total)
+            self.tags.add(f'author:{author_id}')
+        for user_id, author_id in pairs:
+            timeline.backfill(user_id, author_id)
+            cache.delete(caching.count_key('follow', user_id))
+        self.imported['follow'] += len(pairs)
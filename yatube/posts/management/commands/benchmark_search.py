@@ -0,0 +1,155 @@
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search_index
+from posts.models import Post, User
+from posts.search import SearchResults
+
+SYLLABLES = (
+    'ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло', 'ме', 'ну', 'па',
+    'ро', 'си', 'ту', 'фе', 'ха', 'це', 'чу', 'ша', 'ле', 'ми', 'ра',
+)
+CONSONANTS = 'бвгдзклмнпрст'
+ENDINGS = ('', 'а', 'ы', 'е', 'у', 'ой', 'ами', 'ах', 'ом', 'ов')
+VOCABULARY_SIZE = 20000
+
+
+def make_roots(rng, size):
+    roots = set()
+    while len(roots) < size:
+        roots.add(
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 3)))
+            + rng.choice(CONSONANTS)
+        )
+    return sorted(roots)
+
+
+def make_queries(roots):
+    """Запросы по корням разной частоты: частота слов в постах
+    распределена по Ципфу, корень с меньшим номером встречается чаще."""
+    frequent, medium, rare = roots[10], roots[500], roots[5000]
+    typo = medium[:3] + ('о' if medium[3] != 'о' else 'а') + medium[4:]
+    return (
+        ('частое слово', frequent + 'ами'),
+        ('среднее слово', medium + 'ами'),
+        ('редкое слово', rare + 'ами'),
+        ('префикс', rare[:-2]),
+        ('два слова', f'{frequent}ах {medium}ой'),
+        ('опечатка', typo + 'у'),
+    )
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def like_count(query):
+    posts = Post.objects.all()
+    for word in query.split():
+        posts = posts.filter(text__contains=word)
+    return posts.count(), list(posts.order_by('-pk')[:10])
+
+
+def index_count(query):
+    results = SearchResults(Post.objects.select_related('author'), query)
+    return results.count(), results[0:10]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по обратному индексу основ с LIKE на '
+        'синтетических постах. Данные создаются в транзакции и '
+        'откатываются по окончании.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=1_000_000,
+            help='Число синтетических постов.',
+        )
+        parser.add_argument(
+            '--words',
+            type=int,
+            default=12,
+            help='Число слов в посте.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=search_index.BATCH_SIZE,
+            help='Размер пачки при создании постов и индекса.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Сколько раз повторять каждый запрос.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        author = User.objects.create_user(username='search-benchmark')
+        roots = make_roots(rng, VOCABULARY_SIZE)
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(roots) + 1)
+        ))
+
+        def text():
+            return ' '.join(
+                root + rng.choice(ENDINGS)
+                for root in rng.choices(
+                    roots, cum_weights=weights, k=options['words']
+                )
+            )
+
+        started = time.perf_counter()
+        for offset in range(0, options['posts'], batch_size):
+            count = min(batch_size, options['posts'] - offset)
+            Post.objects.bulk_create(
+                Post(author=author, text=text()) for _ in range(count)
+            )
+        self.stdout.write(
+            f'Создано постов: {options["posts"]} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+
+        started = time.perf_counter()
+        search_index.rebuild(batch_size)
+        self.stdout.write(
+            f'Индекс построен за {time.perf_counter() - started:.1f} с'
+        )
+
+        self.stdout.write(
+            f'{"запрос":<36}{"LIKE, мс":>10}{"найдено":>10}'
+            f'{"индекс, мс":>12}{"найдено":>10}'
+        )
+        for label, query in make_queries(roots):
+            like_time, (like_found, _) = best_of(
+                options['repeat'], lambda: like_count(query)
+            )
+            index_time, (index_found, _) = best_of(
+                options['repeat'], lambda: index_count(query)
+            )
+            self.stdout.write(
+                f'{label + ": " + query:<36}'
+                f'{like_time * 1000:>10.1f}{like_found:>10}'
+                f'{index_time * 1000:>12.1f}{index_found:>10}'
+            )
@@ -0,0 +1,103 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from posts import api
+from posts.models import Group, Post, User
+
+from .benchmark_search import best_of
+
+
+def from_models(names):
+    """Сериализация через объекты Post: only() сужает SELECT, но модели
+    всё равно создаются."""
+    related = [name for name in ('author', 'group') if name in names]
+    posts = Post.objects.select_related(*related).only(
+        *api.lookups(api.POST_FIELDS, names)
+    )
+    getters = {
+        'id': lambda post: post.pk,
+        'author': lambda post: post.author.username,
+        'group': lambda post: post.group.slug if post.group else None,
+        'image': lambda post: api.image_url(post.image.name),
+    }
+    results = [
+        {
+            name: getters[name](post) if name in getters
+            else getattr(post, name)
+            for name in names
+        }
+        for post in posts
+    ]
+    return json.dumps(results, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def from_rows(names):
+    """Сериализация строк values(), как в API."""
+    rows = Post.objects.values(*api.lookups(api.POST_FIELDS, names))
+    results = [api.serialize(row, api.POST_FIELDS, names) for row in rows]
+    return json.dumps(results, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость сериализации постов через модели и через '
+        'строки values(). Данные создаются в транзакции и откатываются '
+        'по окончании.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=10000,
+            help='Число синтетических постов.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз повторять каждый замер.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        author = User.objects.create_user(username='serialization-benchmark')
+        group = Group.objects.create(
+            title='Бенчмарк', slug='serialization-benchmark'
+        )
+        Post.objects.bulk_create(
+            Post(
+                author=author,
+                group=group if number % 2 else None,
+                text=f'Синтетический пост номер {number} ' * 5,
+            )
+            for number in range(options['posts'])
+        )
+        cases = (
+            ('все поля', tuple(api.POST_FIELDS)),
+            ('fields=id,text', ('id', 'text')),
+        )
+        self.stdout.write(
+            f'{"поля":<20}{"модели, строк/с":>18}{"values(), строк/с":>20}'
+            f'{"ускорение":>12}'
+        )
+        total = Post.objects.count()
+        for label, names in cases:
+            models_time, _ = best_of(
+                options['repeat'], lambda: from_models(names)
+            )
+            rows_time, _ = best_of(
+                options['repeat'], lambda: from_rows(names)
+            )
+            self.stdout.write(
+                f'{label:<20}{total / models_time:>18.0f}'
+                f'{total / rows_time:>20.0f}'
+                f'{models_time / rows_time:>11.1f}x'
+            )
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import uploads
+
+
+def make_photo(path, width, height):
+    """JPEG с шумом и градиентом: сжимается примерно как фотография."""
+    noise = Image.effect_noise((width, height), 40)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    Image.merge('RGB', (noise, gradient, noise)).save(
+        path, 'JPEG', quality=90
+    )
+
+
+def full_decode(path, max_side):
+    """Как без конвейера: оригинал декодируется целиком и уменьшается."""
+    with Image.open(path) as picture:
+        picture.load()
+        picture = picture.resize(
+            (max_side, round(max_side * picture.height / picture.width)),
+            Image.LANCZOS,
+        )
+    return picture.size
+
+
+def pipeline(path, max_side):
+    """Проверка по заголовку и уменьшение через draft/reduce."""
+    with open(path, 'rb') as source, \
+            tempfile.TemporaryDirectory() as temp_dir:
+        settings.POSTS_IMAGE_MAX_SIDE = max_side
+        settings.FILE_UPLOAD_TEMP_DIR = temp_dir
+        upload = UploadedFile(
+            source, 'photo.jpg', 'image/jpeg', os.path.getsize(path)
+        )
+        result = uploads.prepare_image(upload)
+        with Image.open(result) as picture:
+            return picture.size
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux — в килобайтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(func, args, results):
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    size = func(*args)
+    results.put((
+        peak_rss_mb() - before, time.perf_counter() - started, size
+    ))
+
+
+def in_child(func, *args):
+    """Запускает func в отдельном процессе: пик RSS одного замера
+    не влияет на другие."""
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=measure, args=(func, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пиковую память и время обработки большой фотографии: '
+        'полное декодирование против конвейера загрузки posts.uploads. '
+        'Каждый замер идёт в отдельном процессе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--megapixels',
+            type=int,
+            default=40,
+            help='Разрешение синтетической фотографии.',
+        )
+        parser.add_argument(
+            '--max-side',
+            type=int,
+            default=settings.POSTS_IMAGE_MAX_SIDE,
+            help='До какой большей стороны уменьшать.',
+        )
+
+    def handle(self, *args, **options):
+        width = int((options['megapixels'] * 1_000_000 * 4 / 3) ** 0.5)
+        height = width * 3 // 4
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'photo.jpg')
+            process = multiprocessing.get_context('fork').Process(
+                target=make_photo, args=(path, width, height)
+            )
+            process.start()
+            process.join()
+            self.stdout.write(
+                f'Фотография {width}×{height}, '
+                f'{os.path.getsize(path) / 1024 / 1024:.1f} МБ'
+            )
+            self.stdout.write(
+                f'{"способ":<20}{"пик RSS, МБ":>14}{"время, с":>10}'
+                f'{"результат":>14}'
+            )
+            for label, func in (
+                ('полное декодирование', full_decode),
+                ('draft/reduce', pipeline),
+            ):
+                peak, seconds, size = in_child(
+                    func, path, options['max_side']
+                )
+                self.stdout.write(
+                    f'{label:<20}{peak:>14.1f}{seconds:>10.2f}'
+                    f'{size[0]:>8}×{size[1]}'
+                )
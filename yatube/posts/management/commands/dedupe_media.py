@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+from posts.storage import content_hash, post_images
+
+
+def walk(storage, directory):
+    """Имена всех файлов каталога хранилища, включая подкаталоги."""
+    directories, files = storage.listdir(directory)
+    for name in sorted(files):
+        yield f'{directory}/{name}'
+    for subdirectory in sorted(directories):
+        yield from walk(storage, f'{directory}/{subdirectory}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит картинки в MEDIA_ROOT/posts/ на имена по хешу '
+        'содержимого: одинаковые файлы остаются в одном экземпляре, '
+        'посты переключаются на него пачками, число ссылок '
+        'пересчитывается. Прерванную команду можно запустить снова. '
+        'Миниатюры новых имён потом создаёт generate_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=media.BATCH_SIZE,
+            help='Сколько постов переключать одним запросом.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        seen = renamed = removed = freed = 0
+        if post_images.exists('posts'):
+            names = list(walk(post_images, 'posts'))
+        else:
+            names = []
+        for name in names:
+            seen += 1
+            with post_images.open(name) as content:
+                canonical = media.canonical_name(name, content_hash(content))
+            if canonical == name:
+                continue
+            if post_images.exists(canonical):
+                removed += 1
+                freed += post_images.size(name)
+            else:
+                renamed += 1
+            if not dry_run:
+                media.move(name, canonical, options['batch_size'])
+        if not dry_run:
+            fixed = media.reconcile()
+            self.stdout.write(f'Исправлено счётчиков ссылок: {fixed}')
+        self.stdout.write(
+            f'Файлов: {seen}, переименовано: {renamed}, '
+            f'дубликатов удалено: {removed}, '
+            f'освобождено: {freed / 1024 / 1024:.1f} МБ'
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporter
+from posts.models import Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты автора или группы и, по желанию, '
+        'их комментарии в JSON Lines или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--author', help='username автора.')
+        source.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--format', choices=sorted(exporter.FORMATS), default='jsonl'
+        )
+        parser.add_argument(
+            '--comments',
+            action='store_true',
+            help='Добавить комментарии к постам.',
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки; по умолчанию stdout.'
+        )
+
+    def handle(self, *args, **options):
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет пользователя {options["author"]}.')
+            posts = Post.objects.filter(author=author)
+        else:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}.')
+            posts = Post.objects.filter(group=group)
+        chunks = exporter.export(
+            posts, options['format'], options['comments']
+        )
+        if options['output'] is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(
+            options['output'], 'w', encoding='utf-8', newline=''
+        ) as output:
+            output.writelines(chunks)
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+# Сколько пачек на процесс может ждать в очереди пула: список имён
+# читается из базы по мере обработки, а не отправляется в пул целиком.
+PENDING_PER_WORKER = 2
+
+
+def generate_chunk(names):
+    """generate_safe для пачки картинок: одна задача пула на пачку."""
+    return [thumbnails.generate_safe(name) for name in names]
+
+
+def bounded_map(executor, function, items, chunk_size, max_pending):
+    """Как executor.map(function, items, chunksize=chunk_size), но
+    в пуле не больше max_pending пачек: новая отправляется, когда
+    готова одна из прежних. Результаты — в порядке готовности."""
+    items = iter(items)
+    pending = set()
+    for chunk in iter(lambda: list(islice(items, chunk_size)), []):
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+        pending.add(executor.submit(function, chunk))
+    for future in pending:
+        yield from future.result()
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры всех картинок постов параллельно '
+        'на нескольких ядрах. Готовые миниатюры не пересоздаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Число процессов; 0 — без пула, в текущем процессе.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20,
+            help='Сколько картинок отдавать процессу за раз.',
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct().iterator()
+        if options['workers']:
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=thumbnails.init_worker,
+            ) as executor:
+                self.report(bounded_map(
+                    executor,
+                    generate_chunk,
+                    names,
+                    options['chunk_size'],
+                    options['workers'] * PENDING_PER_WORKER,
+                ))
+        else:
+            self.report(map(thumbnails.generate_safe, names))
+
+    def report(self, results):
+        done = failed = 0
+        for name, error in results:
+            if error is None:
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Картинок обработано: {done}, с ошибками: {failed}'
+        )
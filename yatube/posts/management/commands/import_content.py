@@ -0,0 +1,91 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import importer
+from posts.models import ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково импортирует посты, комментарии и подписки из JSON Lines '
+        'или CSV пачками через bulk_create. После сбоя повторный запуск '
+        'продолжает с последней записанной пачки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с записями или «-» для стандартного ввода.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(importer.READERS),
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--type',
+            choices=importer.RECORD_TYPES,
+            help='Тип записей, у которых нет поля type.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importer.BATCH_SIZE,
+            help='Число записей в одной транзакции.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Имя чекпоинта; по умолчанию — полный путь к файлу.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Забыть сохранённую позицию и начать сначала.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format']
+        if data_format is None:
+            extension = os.path.splitext(path)[1].lstrip('.').lower()
+            data_format = 'jsonl' if extension in ('json', 'ndjson') else (
+                extension
+            )
+        if data_format not in importer.READERS:
+            raise CommandError('Укажите формат файла через --format.')
+        checkpoint = options['checkpoint'] or (
+            'stdin' if path == '-' else os.path.abspath(path)
+        )
+        if options['restart']:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        job = importer.Importer(
+            checkpoint,
+            batch_size=options['batch_size'],
+            default_type=options['type'],
+        )
+        if job.checkpoint.position:
+            self.stdout.write(
+                f'Продолжение с записи {job.checkpoint.position + 1}.'
+            )
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, encoding='utf-8', newline='')
+        )
+        try:
+            imported = job.run(importer.READERS[data_format](stream))
+        except (importer.ImportFailed, IntegrityError, ValueError) as error:
+            raise CommandError(
+                f'{error}. Записано до позиции {job.checkpoint.position}.'
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            'Импортировано: постов {post}, комментариев {comment}, '
+            'подписок {follow}.'.format(**{
+                record_type: imported[record_type]
+                for record_type in importer.RECORD_TYPES
+            })
+        ))
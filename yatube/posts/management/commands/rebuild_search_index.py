@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import search, search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново строит поисковые индексы: полнотекстовый индекс FTS5 '
+        'и обратный индекс по основам слов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=search_index.BATCH_SIZE,
+            help='Число постов, индексируемых в одной транзакции.',
+        )
+        parser.add_argument(
+            '--optimize',
+            action='store_true',
+            help='После построения слить сегменты индекса FTS5 в один.',
+        )
+
+    def handle(self, *args, **options):
+        search.restore_triggers()
+        search.rebuild_index()
+        if options['optimize']:
+            search.optimize_index()
+        posts, groups = search_index.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковый индекс перестроен: постов {posts}, групп {groups}.'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=timeline.BATCH_SIZE,
+            help='Число записей в одном INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        total = timeline.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Лента пересобрана: {total} записей.')
+        )
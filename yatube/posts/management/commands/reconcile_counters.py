@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет денормализованные счётчики постов, комментариев '
+        'и подписок с данными и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=counters.BATCH_SIZE,
+            help='Число строк, проверяемых в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = counters.reconcile_user_counters(batch_size)
+        posts = counters.reconcile_comment_counters(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {users}, постов {posts}.'
+        ))
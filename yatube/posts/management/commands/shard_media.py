@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import media
+from posts.models import Post, ShardCheckpoint
+from posts.storage import content_hash, name_digest, post_images
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает картинки постов по подкаталогам из хеша '
+        '(settings.POSTS_MEDIA_FANOUT) и переписывает Post.image пачками. '
+        'Позиция сохраняется после каждой пачки: прерванная команда '
+        'продолжает с места остановки, законченный проход её удаляет. '
+        'Миниатюры новых имён потом создаёт generate_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=media.BATCH_SIZE,
+            help='Сколько постов обрабатывать за пачку.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Забыть сохранённую позицию и начать сначала.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # Позиция прохода с другой раскладкой к текущей не относится.
+        fanout = 'x'.join(map(str, settings.POSTS_MEDIA_FANOUT))
+        if options['restart']:
+            ShardCheckpoint.objects.filter(fanout=fanout).delete()
+        checkpoint, _ = ShardCheckpoint.objects.get_or_create(fanout=fanout)
+        if checkpoint.position:
+            self.stdout.write(
+                f'Продолжение с поста с id больше {checkpoint.position}.'
+            )
+        moved = missing = 0
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=checkpoint.position).exclude(
+                    image=''
+                ).order_by('pk').values_list('pk', 'image')[:batch_size]
+            )
+            if not rows:
+                break
+            for name in dict.fromkeys(image for _, image in rows):
+                canonical = self.canonical_name(name)
+                if canonical is None:
+                    missing += 1
+                    self.stderr.write(f'{name}: файл не найден')
+                elif canonical != name:
+                    media.move(name, canonical, batch_size)
+                    moved += 1
+            checkpoint.position = rows[-1][0]
+            checkpoint.save()
+        # Проход закончен: следующий запуск (например, после смены
+        # POSTS_MEDIA_FANOUT) снова проверяет все посты.
+        checkpoint.delete()
+        self.stdout.write(
+            f'Файлов перенесено: {moved}, не найдено: {missing}'
+        )
+
+    def canonical_name(self, name):
+        """Имя файла name при текущей раскладке или None, если файла
+        нет."""
+        digest = name_digest(name)
+        if digest is not None:
+            canonical = media.canonical_name(name, digest)
+            if canonical == name or post_images.exists(canonical):
+                return canonical
+        if not post_images.exists(name):
+            return None
+        if digest is None:
+            # Файл, загруженный до перехода на имена по хешу.
+            with post_images.open(name) as content:
+                digest = content_hash(content)
+        return media.canonical_name(name, digest)
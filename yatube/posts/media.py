@@ -0,0 +1,137 @@
+"""Ссылки постов на файлы картинок в хранилище posts.storage.
+
+Один файл может быть картинкой многих постов, поэтому при удалении
+поста или замене картинки файл удаляется, только когда на него
+не ссылается ни один пост. Число ссылок хранится в MediaFile и
+меняется атомарно, как счётчики в posts.counters.
+
+move переносит файл под новое имя (другая раскладка или имя по хешу)
+и переключает на него посты; им пользуются команды dedupe_media
+и shard_media.
+"""
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from sorl.thumbnail import delete as delete_thumbnails
+
+from . import caching, thumbnails
+from .models import MediaFile, Post
+from .storage import name_digest, post_images
+
+BATCH_SIZE = 500
+
+
+def add_reference(name):
+    if not name:
+        return
+    updated = MediaFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    )
+    if updated:
+        return
+    # Строки ещё нет: создаём её с реальным числом ссылок, которое
+    # уже учитывает сохранённый пост.
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(
+                name=name, references=Post.objects.filter(image=name).count()
+            )
+    except IntegrityError:
+        MediaFile.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+
+
+def release(name):
+    """Снимает ссылку на name; файл без ссылок удаляется после
+    фиксации транзакции."""
+    if not name:
+        return
+    MediaFile.objects.filter(name=name).update(
+        references=F('references') - 1
+    )
+    transaction.on_commit(lambda: delete_unused(name))
+
+
+def delete_unused(name):
+    """Удаляет файл name с миниатюрами, если на него никто
+    не ссылается. Возвращает True, если файл удалён."""
+    if name_digest(name) is None:
+        # Файл сохранён не этим хранилищем (до dedupe_media или вообще
+        # вне MEDIA_ROOT): такие файлы, как и раньше, не удаляются.
+        return False
+    # Счётчик мог разойтись с постами (bulk_create, update), поэтому
+    # решение принимается по самим постам.
+    if (MediaFile.objects.filter(name=name, references__gt=0).exists()
+            or Post.objects.filter(image=name).exists()):
+        return False
+    thumbnails.delete(name)
+    post_images.delete(name)
+    MediaFile.objects.filter(name=name).delete()
+    return True
+
+
+def reconcile(names=None):
+    """Пересчитывает по постам число ссылок на файлы names (по умолчанию
+    на все); возвращает число исправленных строк."""
+    posts = Post.objects.exclude(image='')
+    stored = MediaFile.objects.all()
+    if names is not None:
+        posts = posts.filter(image__in=names)
+        stored = stored.filter(name__in=names)
+    actual = dict(
+        posts.order_by().values('image').annotate(
+            total=Count('pk')
+        ).values_list('image', 'total')
+    )
+    fixed = 0
+    stored = stored.values_list('pk', 'name', 'references')
+    for pk, name, references in stored.iterator():
+        total = actual.pop(name, 0)
+        if references != total:
+            MediaFile.objects.filter(pk=pk).update(references=total)
+            fixed += 1
+    MediaFile.objects.bulk_create(
+        [
+            MediaFile(name=name, references=total)
+            for name, total in actual.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return fixed + len(actual)
+
+
+def canonical_name(name, digest):
+    """Имя файла с хешем digest при текущей раскладке каталогов."""
+    upload_to = Post._meta.get_field('image').upload_to
+    return post_images.hashed_name(
+        os.path.join(upload_to, os.path.basename(name)), digest
+    )
+
+
+def move(name, canonical, batch_size=BATCH_SIZE):
+    """Переносит файл name в canonical и переключает на него посты
+    пачками по batch_size; возвращает число переключённых постов.
+
+    Если canonical уже есть (те же байты), name просто удаляется.
+    Старое имя удаляется последним, поэтому прерванный перенос
+    можно повторить.
+    """
+    if not post_images.exists(canonical):
+        # Жёсткая ссылка, а не переименование: пока посты
+        # не переключены, файл доступен под обоими именами.
+        path = post_images.path(canonical)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.link(post_images.path(name), path)
+    moved = caching.touch_posts(
+        Post.objects.filter(image=name), batch_size, image=canonical
+    )
+    # Миниатюры, созданные до перехода на posts.storage, записаны
+    # в kvstore с ключом хранилища по умолчанию.
+    delete_thumbnails(name, delete_file=False)
+    thumbnails.delete(name)
+    post_images.delete(name)
+    MediaFile.objects.filter(name=name).delete()
+    reconcile([canonical])
+    return moved
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:43
+
+from django.db import migrations, models
+
+
+def drop_import_checkpoint(apps, schema_editor):
+    # Раньше shard_media хранила позицию в ImportCheckpoint.
+    apps.get_model('posts', 'ImportCheckpoint').objects.filter(
+        name='shard_media'
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_media_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fanout', models.CharField(max_length=32, unique=True, verbose_name='Раскладка')),
+                ('position', models.BigIntegerField(default=0, verbose_name='id последнего поста')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(drop_import_checkpoint, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,15 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import post_images
+
 User = get_user_model()
 
 
 class Post(models.Model):
     text = models.TextField(help_text='Текст нового поста')
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -25,11 +28,34 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=post_images,
+        blank=True,
+        db_index=True,
+    )
+    comments_count = models.IntegerField(
+        'Число комментариев', default=0, editable=False
     )
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'], name='post_group_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'], name='post_author_idx'
+            ),
+            models.Index(fields=['updated_at'], name='post_updated_idx'),
+            models.Index(
+                fields=['group', 'updated_at'], name='post_group_updated_idx'
+            ),
+            models.Index(
+                fields=['author', 'updated_at'], name='post_author_updated_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -62,6 +88,13 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'], name='comment_post_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -86,3 +119,151 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique follow'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: запись на каждую пару
+    подписчик-пост, заполняется при публикации и подписке."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique timeline entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'], name='timeline_user_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_author_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами через F-выражения, расхождения исправляет
+    команда reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField('Число постов', default=0)
+    followers_count = models.IntegerField('Число подписчиков', default=0)
+    following_count = models.IntegerField('Число подписок', default=0)
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class SearchTerm(models.Model):
+    """Словарь поискового индекса: основы слов после стемминга."""
+    text = models.CharField('Основа', max_length=100, unique=True)
+
+    def __str__(self):
+        return self.text
+
+
+class SearchTrigram(models.Model):
+    """Символьные триграммы основ для нечёткого поиска по словарю."""
+    trigram = models.CharField(max_length=3)
+    term = models.ForeignKey(
+        SearchTerm,
+        on_delete=models.CASCADE,
+        related_name='trigrams',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['trigram', 'term'], name='unique search trigram'
+            )
+        ]
+
+
+class SearchPosting(models.Model):
+    """Обратный индекс: в каких постах и группах встречается основа."""
+    term = models.ForeignKey(
+        SearchTerm,
+        on_delete=models.CASCADE,
+        related_name='postings',
+        db_index=False,
+    )
+    post = models.ForeignKey(
+        Post,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='search_postings',
+    )
+    group = models.ForeignKey(
+        Group,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='search_postings',
+    )
+    frequency = models.PositiveIntegerField('Число вхождений', default=1)
+
+    class Meta:
+        indexes = [
+            # frequency в индексе: ранжирование не читает саму таблицу.
+            models.Index(
+                fields=['term', 'post', 'frequency'], name='posting_post_idx'
+            ),
+            models.Index(fields=['term', 'group'], name='posting_group_idx'),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько записей источника уже импортировано командой
+    import_content. Обновляется в той же транзакции, что и данные."""
+    name = models.CharField('Источник', max_length=255, unique=True)
+    position = models.BigIntegerField('Импортировано записей', default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
+
+
+class ShardCheckpoint(models.Model):
+    """id последнего поста, картинку которого shard_media уже разложила
+    по раскладке fanout. Удаляется, когда проход закончен."""
+    fanout = models.CharField('Раскладка', max_length=32, unique=True)
+    position = models.BigIntegerField('id последнего поста', default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.fanout}: {self.position}'
+
+
+class MediaFile(models.Model):
+    """Файл картинки в хранилище posts.storage и число постов, которые
+    на него ссылаются. Поддерживается сигналами, пересчитывает команда
+    dedupe_media."""
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    references = models.IntegerField('Число ссылок', default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
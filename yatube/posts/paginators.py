@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .caching import cached_count
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Page):
+    """Страница, открытая по курсору: без номера и подсчёта записей."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CachedCountPaginator(Paginator):
+    """Паджинатор, который не считает COUNT(*) на каждый запрос.
+
+    Число записей берётся из готового значения count (например,
+    из денормализованных счётчиков) или из кеша по ключу count_key
+    с коротким временем жизни.
+    """
+
+    def __init__(self, object_list, per_page, count=None, count_key=None,
+                 count_timeout=COUNT_CACHE_TIMEOUT, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+        self.count_key = count_key
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if self.count_key is None:
+            return super().count
+        return cached_count(
+            self.count_key, self.object_list, self.count_timeout
+        )
+
+    def page(self, number):
+        # Срез не зависит от count: устаревшее число из кеша может сбить
+        # только номера страниц, но не содержимое текущей страницы.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+class CursorPaginator(CachedCountPaginator):
+    """Паджинатор по ключу (pub_date, id) вместо LIMIT/OFFSET.
+
+    Соседние страницы открываются по непрозрачным токенам ?after=/?before=,
+    поэтому стоимость запроса не зависит от глубины страницы.
+    Номера страниц (?page=) продолжают работать как запасной вариант;
+    при page_numbers=False они отключаются и COUNT не выполняется вовсе.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk'), page_numbers=True, **kwargs):
+        self.ordering = tuple(ordering)
+        self.cursor_fields = tuple(name.lstrip('-') for name in ordering)
+        self.page_numbers = page_numbers
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+
+    def get_page(self, number=None, after=None, before=None):
+        if after or before:
+            try:
+                return self.cursor_page(after or before, forward=bool(after))
+            except InvalidCursor:
+                pass
+        if not self.page_numbers:
+            return self.cursor_page(None)
+        page = super().get_page(number)
+        self._set_cursors(page)
+        return page
+
+    def cursor_page(self, cursor, forward=True):
+        """Страница после (forward) или до курсора; без курсора — первая."""
+        rows = self.object_list
+        if cursor is not None:
+            values = self.decode_cursor(cursor)
+            rows = rows.filter(self._keyset_filter(values, forward))
+        ordering = self.ordering if forward else self._reversed_ordering()
+        rows = list(rows.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            page = CursorPage(rows, self, has_more, cursor is not None)
+        else:
+            rows.reverse()
+            page = CursorPage(rows, self, True, has_more)
+        self._set_cursors(page)
+        return page
+
+    def encode_cursor(self, obj):
+        # Строки values() — словари, объекты моделей — с атрибутами.
+        values = []
+        for name in self.cursor_fields:
+            value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor(cursor)
+        if (not isinstance(values, list)
+                or len(values) != len(self.cursor_fields)
+                or not all(isinstance(value, (str, int)) for value in values)):
+            raise InvalidCursor(cursor)
+        try:
+            values = [
+                self._get_field(name).to_python(value)
+                for name, value in zip(self.cursor_fields, values)
+            ]
+        except (TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+        # None нельзя сравнивать в условии по ключу.
+        if None in values:
+            raise InvalidCursor(cursor)
+        return values
+
+    def _get_field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def _keyset_filter(self, values, forward):
+        condition = Q()
+        equal = Q()
+        for order, name, value in zip(
+                self.ordering, self.cursor_fields, values):
+            lookup = 'lt' if order.startswith('-') == forward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _set_cursors(self, page):
+        objects = page.object_list = list(page.object_list)
+        page.next_cursor = (
+            self.encode_cursor(objects[-1])
+            if objects and page.has_next() else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(objects[0])
+            if objects and page.has_previous() else None
+        )
@@ -0,0 +1,185 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Таблица posts_post_fts хранит только индекс: текст берётся из posts_post
+(external content), а синхронность поддерживают триггеры из миграции.
+По ней работают поиск в админке и сниппеты; поиск на сайте отбирает
+и ранжирует посты по основам слов (см. search_index).
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from . import search_index
+from .models import Group
+
+FTS_TABLE = 'posts_post_fts'
+SNIPPET_TOKENS = 16
+# Границы совпадения в сниппете: символы, которых нет в тексте постов,
+# чтобы сниппет можно было экранировать целиком и затем подсветить.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+TERM_RE = re.compile(r'\w+')
+
+# Те же триггеры создаёт миграция 0015_post_fts. SQLite-бэкенд Django
+# пересоздаёт таблицу при изменении полей Post, и триггеры при этом
+# теряются, поэтому после каждой миграции они проверяются заново.
+TRIGGERS = {
+    'posts_post_fts_insert': (
+        'AFTER INSERT ON posts_post BEGIN'
+        f' INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);'
+        ' END'
+    ),
+    'posts_post_fts_delete': (
+        'AFTER DELETE ON posts_post BEGIN'
+        f' INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)'
+        " VALUES ('delete', old.id, old.text);"
+        ' END'
+    ),
+    'posts_post_fts_update': (
+        'AFTER UPDATE OF text ON posts_post BEGIN'
+        f' INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)'
+        " VALUES ('delete', old.id, old.text);"
+        f' INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);'
+        ' END'
+    ),
+}
+
+
+def match_expression(query):
+    """Переводит ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово ищется как префикс, все слова должны встретиться.
+    Операторы FTS5 из ввода не интерпретируются.
+    """
+    terms = TERM_RE.findall(query.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под query, для filter(pk__in=...)."""
+    expression = match_expression(query)
+    if not expression:
+        return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE 0', ())
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (expression,),
+    )
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+class SearchResults:
+    """Ранжированные результаты поиска для Paginator.
+
+    Слова запроса раскрываются в основы по словарю search_index, посты
+    отбираются и ранжируются по обратному индексу SearchPosting.
+    FTS5 используется только для сниппетов постов одной страницы,
+    которые приходят в атрибуте snippet.
+    """
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.words = search_index.expand_query(query)
+
+    @cached_property
+    def ranked(self):
+        return search_index.ranked_posts(self.words)
+
+    def count(self):
+        if self.words is None:
+            return 0
+        return search_index.count_posts(self.words)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        if self.words is None or key.stop <= start:
+            return []
+        ids = [row['post_id'] for row in self.ranked[start:key.stop]]
+        posts = self.queryset.in_bulk(ids)
+        snippets = self.snippets(ids)
+        results = []
+        for pk in ids:
+            post = posts.get(pk)
+            if post is not None:
+                post.snippet = snippets.get(pk) or Truncator(
+                    post.text
+                ).words(SNIPPET_TOKENS)
+                results.append(post)
+        return results
+
+    def snippets(self, ids):
+        """Сниппеты с подсветкой найденных основ для постов ids."""
+        expression = ' OR '.join(
+            f'"{text}"*' for text in search_index.term_texts(self.words)
+        )
+        if not ids or not expression:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'AND rowid IN ({", ".join(["%s"] * len(ids))})',
+                (
+                    MATCH_START, MATCH_END, '…', SNIPPET_TOKENS,
+                    expression, *ids,
+                ),
+            )
+            return {pk: highlight(snippet) for pk, snippet in cursor}
+
+    def groups(self):
+        if self.words is None:
+            return Group.objects.none()
+        return search_index.matching_groups(self.words)
+
+
+def restore_triggers(using='default', **kwargs):
+    """Обработчик post_migrate: восстанавливает потерянные триггеры
+    и перестраивает индекс, если они пропадали."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name LIKE %s',
+            (f'{FTS_TABLE}%',),
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return
+        missing = TRIGGERS.keys() - existing
+        for name in missing:
+            cursor.execute(f'CREATE TRIGGER {name} {TRIGGERS[name]}')
+        if missing:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def rebuild_index():
+    """Перестраивает индекс целиком по содержимому posts_post."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def optimize_index():
+    """Сливает сегменты индекса в один."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+        )
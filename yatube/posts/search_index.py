@@ -0,0 +1,251 @@
+"""Обратный индекс по основам слов для поиска на русском языке.
+
+Текст постов и описаний групп разбивается на слова и сводится к основам
+стеммером. Основы лежат в словаре SearchTerm, их символьные триграммы —
+в SearchTrigram, а SearchPosting связывает основу с постом или группой.
+Точные, префиксные и нечёткие запросы сначала раскрываются в набор основ
+по словарю, а затем отвечаются по SearchPosting без чтения текстов.
+"""
+import re
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
+
+from core.sqlite import chunks
+
+from .models import Group, Post, SearchPosting, SearchTerm, SearchTrigram
+from .stemmer import stem
+
+BATCH_SIZE = 1000
+# Сколько основ может дать одно слово запроса при поиске по префиксу
+# и по триграммам.
+PREFIX_LIMIT = 50
+FUZZY_LIMIT = 10
+FUZZY_THRESHOLD = 0.3
+# Совпадение с основой слова весит больше, чем префиксное или нечёткое.
+EXACT_WEIGHT = 3
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+MAX_TERM_LENGTH = 100
+
+
+def normalize(word):
+    return word.lower().replace('ё', 'е')
+
+
+def terms(text):
+    """Основы слов текста в порядке следования."""
+    return [
+        stem(normalize(word))[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall(text)
+    ]
+
+
+def trigrams(term):
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def ensure_terms(texts):
+    """id основ из словаря; недостающие основы добавляются вместе
+    с триграммами."""
+    ids = {}
+    for chunk in chunks(set(texts)):
+        ids.update(SearchTerm.objects.filter(
+            text__in=chunk
+        ).values_list('text', 'pk'))
+    missing = set(texts) - ids.keys()
+    if not missing:
+        return ids
+    SearchTerm.objects.bulk_create(
+        [SearchTerm(text=text) for text in missing], ignore_conflicts=True
+    )
+    created = {}
+    for chunk in chunks(missing):
+        created.update(SearchTerm.objects.filter(
+            text__in=chunk
+        ).values_list('text', 'pk'))
+    SearchTrigram.objects.bulk_create(
+        [
+            SearchTrigram(trigram=trigram, term_id=pk)
+            for text, pk in created.items()
+            for trigram in trigrams(text)
+        ],
+        ignore_conflicts=True,
+    )
+    ids.update(created)
+    return ids
+
+
+def _postings(documents, field):
+    """SearchPosting для пар (id документа, текст)."""
+    frequencies = {pk: Counter(terms(text)) for pk, text in documents}
+    ids = ensure_terms(
+        {term for counter in frequencies.values() for term in counter}
+    )
+    return [
+        SearchPosting(term_id=ids[term], frequency=count, **{field: pk})
+        for pk, counter in frequencies.items()
+        for term, count in counter.items()
+    ]
+
+
+@transaction.atomic
+def index_post(post):
+    SearchPosting.objects.filter(post=post).delete()
+    SearchPosting.objects.bulk_create(
+        _postings([(post.pk, post.text)], 'post_id')
+    )
+
+
+def index_posts(posts):
+    """Добавляет в индекс новые посты, у которых ещё нет вхождений."""
+    SearchPosting.objects.bulk_create(
+        _postings([(post.pk, post.text) for post in posts], 'post_id')
+    )
+
+
+@transaction.atomic
+def index_group(group):
+    SearchPosting.objects.filter(group=group).delete()
+    SearchPosting.objects.bulk_create(
+        _postings(
+            [(group.pk, f'{group.title} {group.description}')], 'group_id'
+        )
+    )
+
+
+def _index_batches(rows, field, batch_size):
+    indexed = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return indexed
+        with transaction.atomic():
+            SearchPosting.objects.bulk_create(_postings(batch, field))
+        indexed += len(batch)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Строит индекс заново по всем постам и группам.
+
+    Посты читаются потоком и индексируются пачками по batch_size,
+    каждая пачка пишется в своей транзакции. Возвращает пару
+    (число постов, число групп).
+    """
+    SearchPosting.objects.all().delete()
+    unused = SearchTerm.objects.filter(postings__isnull=True)
+    SearchTrigram.objects.filter(term__in=unused).delete()
+    unused.delete()
+    posts = _index_batches(
+        Post.objects.order_by('pk').values_list('pk', 'text').iterator(
+            chunk_size=batch_size
+        ),
+        'post_id',
+        batch_size,
+    )
+    groups = _index_batches(
+        (
+            (pk, f'{title} {description}')
+            for pk, title, description in Group.objects.values_list(
+                'pk', 'title', 'description'
+            ).iterator(chunk_size=batch_size)
+        ),
+        'group_id',
+        batch_size,
+    )
+    return posts, groups
+
+
+def _fuzzy(term):
+    wanted = trigrams(term)
+    candidates = SearchTrigram.objects.filter(
+        trigram__in=wanted
+    ).values('term_id', 'term__text').annotate(
+        shared=Count('pk')
+    ).order_by('-shared')[:FUZZY_LIMIT * 5]
+    similar = {}
+    for row in candidates:
+        shared = row['shared']
+        union = len(wanted) + len(trigrams(row['term__text'])) - shared
+        if shared / union >= FUZZY_THRESHOLD and len(similar) < FUZZY_LIMIT:
+            similar[row['term_id']] = row['term__text']
+    return similar
+
+
+def expand_word(word):
+    """Основы словаря, подходящие под слово запроса.
+
+    Возвращает пару: id основы самого слова и словарь {id: основа}
+    всех подходящих основ. Основа и префикс ищутся одним диапазонным
+    запросом по уникальному индексу словаря (основа — префикс слова
+    и сортируется первой); если не нашлось ни того, ни другого, слово
+    ищется по триграммам.
+    """
+    word = normalize(word)
+    term = stem(word)
+    matched = dict(SearchTerm.objects.filter(
+        Q(text=term) | Q(text__gte=word, text__lt=word + '\uffff')
+    ).order_by('text').values_list('pk', 'text')[:PREFIX_LIMIT + 1])
+    exact = {pk for pk, text in matched.items() if text == term}
+    if not matched:
+        matched = _fuzzy(term)
+    return exact, matched
+
+
+def expand_query(query):
+    """Раскрывает каждое слово запроса; None, если какое-то слово
+    не встречается в индексе вовсе."""
+    words = []
+    for word in WORD_RE.findall(query):
+        exact, matched = expand_word(word)
+        if not matched:
+            return None
+        words.append((exact, matched))
+    return words or None
+
+
+def _matching(words, field):
+    """Вхождения основ запроса в документы, где есть все слова."""
+    postings = SearchPosting.objects.filter(
+        term_id__in=set().union(*(matched for _, matched in words))
+    )
+    if len(words) == 1:
+        return postings.filter(**{f'{field}__isnull': False})
+    for _, matched in words:
+        postings = postings.filter(**{
+            f'{field}__in': SearchPosting.objects.filter(
+                term_id__in=matched
+            ).values(field)
+        })
+    return postings
+
+
+def count_posts(words):
+    return _matching(words, 'post').values('post_id').distinct().count()
+
+
+def ranked_posts(words):
+    """id постов, содержащих все слова запроса, по убыванию веса."""
+    exact = set().union(*(exact for exact, _ in words))
+    return _matching(words, 'post').values('post_id').annotate(
+        score=Sum(Case(
+            When(term_id__in=exact, then=F('frequency') * EXACT_WEIGHT),
+            default=F('frequency'),
+            output_field=IntegerField(),
+        ))
+    ).order_by('-score', '-post_id')
+
+
+def matching_groups(words):
+    """Группы, в названии или описании которых есть все слова запроса."""
+    return Group.objects.filter(
+        pk__in=_matching(words, 'group').values('group_id')
+    )
+
+
+def term_texts(words):
+    """Тексты всех основ, подходящих под запрос."""
+    return sorted(set().union(*(matched.values() for _, matched in words)))
@@ -0,0 +1,178 @@
+"""Раздача MEDIA_ROOT в продакшене.
+
+django.conf.urls.static работает только при DEBUG и читает файл
+целиком в Python. serve_media проверяет, что файл можно отдавать,
+и передаёт саму передачу фронт-серверу заголовком X-Accel-Redirect
+(nginx) или X-Sendfile (Apache, lighttpd) — см. POSTS_MEDIA_SENDFILE.
+Без фронт-сервера файл отдаётся FileResponse: WSGI-сервер с
+wsgi.file_wrapper (gunicorn) отправляет его через os.sendfile без
+копирования в Python, а диапазоны Range читаются ограниченными кусками.
+
+Картинки постов и миниатюры sorl-thumbnail названы хешами и под тем же
+именем никогда не меняются, поэтому кешируются навсегда (immutable).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from core.decorators import query_budget
+from core.serving import file_validators, resolve, set_cache_headers
+
+from .models import Post
+
+HASHED_NAME_RE = re.compile(r'[0-9a-f]{32}(?:[0-9a-f]{32})?')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """Файл, из которого читается не больше length байт с позиции
+    start: так FileResponse отдаёт диапазон, а не остаток файла."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def is_public(name):
+    """Можно ли отдавать файл name: миниатюры открыты, а картинка
+    поста — только пока на неё ссылается хотя бы один пост."""
+    if name.startswith(sorl_settings.THUMBNAIL_PREFIX):
+        return True
+    upload_to = Post._meta.get_field('image').upload_to
+    return (
+        name.startswith(upload_to)
+        and Post.objects.filter(image=name).exists()
+    )
+
+
+def is_hashed(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return HASHED_NAME_RE.fullmatch(stem) is not None
+
+
+def parse_range(request, size, etag, last_modified):
+    """(начало, конец) из заголовка Range или None для всего файла.
+
+    Несколько диапазонов и устаревший If-Range отдают весь файл, как
+    разрешает RFC 7233. Для невыполнимого диапазона — ValueError.
+    """
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and (
+        parse_http_date_safe(if_range) != last_modified
+    ):
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — последние N байт.
+        if not int(last):
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def sendfile_response(name, path, content_type):
+    """Пустой ответ, который фронт-сервер заменит содержимым файла."""
+    response = HttpResponse(content_type=content_type)
+    if settings.POSTS_MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.POSTS_MEDIA_ACCEL_PREFIX + quote(name)
+        )
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def file_response(request, path, content_type, size, etag, last_modified):
+    try:
+        byte_range = parse_range(request, size, etag, last_modified)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    file = open(path, 'rb')
+    if byte_range is None:
+        # Настоящий файл: wsgi.file_wrapper отправит его sendfile.
+        response = FileResponse(file, content_type=content_type)
+        response.block_size = BLOCK_SIZE
+        return response
+    start, end = byte_range
+    response = FileResponse(
+        FileRange(file, start, end - start + 1),
+        content_type=content_type,
+        status=206,
+    )
+    response.block_size = BLOCK_SIZE
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+@query_budget(1)
+def serve_media(request, path):
+    """Отдаёт файл MEDIA_ROOT/path с проверкой доступа, условными
+    запросами и диапазонами."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    name, full_path = resolve(settings.MEDIA_ROOT, path)
+    if not is_public(name):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    stat = os.stat(full_path)
+    etag, last_modified = file_validators(stat)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        content_type = (
+            mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        )
+        if settings.POSTS_MEDIA_SENDFILE:
+            # Диапазоны и условные запросы фронт-сервер обработает сам.
+            response = sendfile_response(name, full_path, content_type)
+        else:
+            response = file_response(
+                request, full_path, content_type, stat.st_size, etag,
+                last_modified,
+            )
+    if response.status_code not in (200, 206, 304):
+        # 416 на невыполнимый диапазон: кешировать его как файл нельзя.
+        return response
+    response['Accept-Ranges'] = 'bytes'
+    set_cache_headers(
+        response, etag, last_modified, immutable=is_hashed(name)
+    )
+    return response
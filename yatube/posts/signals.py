@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, media, search_index, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+        caching.purge_tags(f'author:{instance.pk}')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.previous_group_id, instance.previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    tags = caching.post_tags(instance)
+    previous_group_id = getattr(instance, 'previous_group_id', None)
+    follower_ids = ()
+    if created:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        follower_ids = timeline.fan_out(instance)
+        tags.append('feed')
+    elif previous_group_id not in (None, instance.group_id):
+        tags.append(f'group:{previous_group_id}')
+    caching.purge_tags(*tags)
+    caching.invalidate_post_counts(
+        instance, previous_group_id, follower_ids
+    )
+    caching.bump_feed_generation()
+    search_index.index_post(instance)
+    image = instance.image.name
+    previous_image = getattr(instance, 'previous_image', None)
+    if image != previous_image:
+        media.add_reference(image)
+        media.release(previous_image)
+    if image and image != previous_image:
+        # Файл уже записан в хранилище; миниатюры строятся после
+        # фиксации транзакции, чтобы пул не опередил запись поста.
+        # Для уже известного файла готовые миниатюры не пересоздаются.
+        transaction.on_commit(lambda: thumbnails.schedule(image))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    caching.purge_tags('feed', *caching.post_tags(instance))
+    # Записи лент подписчиков удалены каскадом вместе с постом.
+    caching.invalidate_post_counts(
+        instance, follower_ids=timeline.followers(instance.author_id)
+    )
+    caching.bump_feed_generation()
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.purge_tags(f'group:{instance.pk}')
+    caching.bump_feed_generation()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    search_index.index_group(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_counter(instance.post_id, 1)
+        caching.purge_tags(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments_counter(instance.post_id, -1)
+    caching.purge_tags(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        cache.delete(caching.count_key('follow', instance.user_id))
+        caching.purge_tags(f'author:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    cache.delete(caching.count_key('follow', instance.user_id))
+    caching.purge_tags(f'author:{instance.author_id}')
@@ -0,0 +1,71 @@
+"""Стеммер русского языка по алгоритму Snowball (Портер).
+
+Окончания ищутся только в области RV — части слова после первой
+гласной. Регулярные выражения привязаны к концу строки, поэтому
+находят самое длинное подходящее окончание.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+RV = re.compile(f'^(.*?[{VOWELS}])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    '(ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(в|вши|вшись))$'
+)
+REFLEXIVE = re.compile('(ся|сь)$')
+ADJECTIVE = re.compile(
+    '(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    '|ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile('(ивш|ывш|ующ|(?<=[ая])(ем|нн|вш|ющ|щ))$')
+VERB = re.compile(
+    '(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено'
+    '|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    '|(?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$'
+)
+NOUN = re.compile(
+    '(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем'
+    '|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+# Окончание -ость снимается, только если оно лежит в области R2.
+DERIVATIONAL = re.compile(f'[{VOWELS}][^{VOWELS}].*ость?$')
+SUPERLATIVE = re.compile('(ейш|ейше)$')
+
+
+def _strip(pattern, word):
+    return pattern.sub('', word, count=1)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа слова: нижний регистр, ё заменена на е, окончания сняты."""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+
+    stripped = _strip(PERFECTIVE_GERUND, rv)
+    if stripped == rv:
+        rv = _strip(REFLEXIVE, rv)
+        stripped = _strip(ADJECTIVE, rv)
+        if stripped != rv:
+            stripped = _strip(PARTICIPLE, stripped)
+        else:
+            stripped = _strip(VERB, rv)
+            if stripped == rv:
+                stripped = _strip(NOUN, rv)
+    rv = stripped
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.search(rv):
+        rv = re.sub('ость?$', '', rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _strip(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return start + rv
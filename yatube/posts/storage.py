@@ -0,0 +1,96 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своих байтов: одинаковые картинки, сколько бы
+раз их ни загрузили, хранятся одним файлом, а миниатюры sorl-thumbnail,
+ключ которых строится из имени исходника, создаются для него один раз
+и общие у всех постов. Сколько постов ссылается на файл, считает
+posts.media; удаляется файл, только когда ссылок не осталось.
+
+Чтобы в одном каталоге не копились сотни тысяч файлов, они
+раскладываются по вложенным подкаталогам из первых символов хеша
+(settings.POSTS_MEDIA_FANOUT): posts/c8/b2/c8b2….gif.
+
+Имя файла не зависит от того, сохраняет ли те же байты параллельно
+другой запрос: файл пишется под временным именем и появляется под
+своим атомарно (os.link), а проигравший гонку просто удаляет копию.
+"""
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла; файл читается кусками."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def name_digest(name):
+    """Хеш из имени файла этого хранилища или None для других имён."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return stem if DIGEST_RE.fullmatch(stem) else None
+
+
+def shards(digest):
+    """Подкаталоги файла с хешем digest."""
+    levels, width = settings.POSTS_MEDIA_FANOUT
+    return [
+        digest[level * width:(level + 1) * width] for level in range(levels)
+    ]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        """Имя файла с хешем digest в подкаталогах каталога name,
+        расширение сохраняется."""
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, *shards(digest), f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            # Такие же байты уже лежат в хранилище.
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        if name_digest(name) is not None:
+            # Существующий файл с этим именем — те же байты: суффикс
+            # увёл бы имя от хеша, и файл выпал бы из подсчёта ссылок.
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if name_digest(name) is None:
+            return super()._save(name, content)
+        temporary = super()._save(f'{name}.part', content)
+        try:
+            os.link(self.path(temporary), self.path(name))
+        except FileExistsError:
+            # Те же байты успел сохранить параллельный запрос.
+            pass
+        finally:
+            os.remove(self.path(temporary))
+        return name
+
+
+post_images = ContentAddressedStorage()
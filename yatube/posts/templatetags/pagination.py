@@ -0,0 +1,19 @@
+from django import template
+
+register = template.Library()
+
+# Параметры положения в ленте: при переходе на другую страницу
+# заменяются, остальные параметры запроса (например, q поиска)
+# сохраняются.
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, **params):
+    """Ссылка ?…&page=2 на другую страницу той же выдачи."""
+    query = context['request'].GET.copy()
+    for param in PAGE_PARAMS:
+        query.pop(param, None)
+    for param, value in params.items():
+        query[param] = value
+    return f'?{query.urlencode()}'
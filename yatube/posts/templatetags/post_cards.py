@@ -0,0 +1,72 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import caching, thumbnails
+
+register = template.Library()
+
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_cache_key(post, variant, media_version=None):
+    """Ключ карточки меняется при правке поста (updated_at), при смене
+    имени автора или адреса группы, которые выводятся в карточке,
+    и с версией тега картинки, когда для неё готовы миниатюры."""
+    related = '|'.join((
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    ))
+    digest = hashlib.md5(related.encode()).hexdigest()
+    return (
+        f'posts:card:{variant}:{post.pk}:'
+        f'{post.updated_at.timestamp()}:{digest}:{media_version}'
+    )
+
+
+def render_cards(posts, variant):
+    # Миниатюры карточек, которые придётся рендерить, ищутся в kvstore
+    # одним запросом на страницу, а не по запросу на карточку.
+    with thumbnails.preload(post.image.name for post in posts):
+        return [
+            render_to_string(
+                CARD_TEMPLATE, {'post': post, 'variant': variant}
+            )
+            for post in posts
+        ]
+
+
+@register.simple_tag
+def post_cards(posts, variant='feed', cached=True):
+    """Возвращает HTML карточек постов: готовые берутся из кеша одним
+    get_many, недостающие рендерятся и сохраняются одним set_many.
+
+    cached=False — для карточек, зависящих от запроса (сниппеты поиска):
+    они рендерятся каждый раз.
+    """
+    posts = list(posts)
+    if not cached:
+        return [mark_safe(card) for card in render_cards(posts, variant)]
+    media_versions = caching.tag_versions({
+        caching.media_tag(post.image.name) for post in posts if post.image
+    })
+    keys = [
+        card_cache_key(post, variant, media_versions.get(
+            caching.media_tag(post.image.name)
+        ))
+        for post in posts
+    ]
+    cards = cache.get_many(keys)
+    missing = {
+        key: post for key, post in zip(keys, posts) if key not in cards
+    }
+    missing = dict(zip(missing, render_cards(missing.values(), variant)))
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,62 @@
+from django import template
+from django.conf import settings
+from django.template.loader import render_to_string
+from sorl.thumbnail import default
+
+from posts import thumbnails
+
+register = template.Library()
+
+PICTURE_TEMPLATE = 'posts/includes/picture.html'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+
+@register.simple_tag
+def responsive_image(image, css_class='card-img my-2'):
+    """<picture> с srcset из готовых вариантов картинки поста.
+
+    Варианты создаются в фоне после загрузки; пока вариантов запасного
+    формата нет, выводится одна миниатюра, как раньше, а пока нет и её —
+    сама картинка: в запросе миниатюры не создаются.
+    """
+    if not image:
+        return ''
+    with thumbnails.preload([image.name]):
+        geometry, options = settings.POSTS_THUMBNAILS[0]
+        thumbnail = default.kvstore.get(
+            thumbnails.thumbnail_file(image.name, geometry, options)
+        )
+        sources = {}
+        for image_format, width, geometry, options in thumbnails.variants():
+            variant = default.kvstore.get(
+                thumbnails.thumbnail_file(image.name, geometry, options)
+            )
+            if variant:
+                sources.setdefault(image_format, []).append((width, variant))
+    formats = list(sources)
+    if not formats or formats[-1] != thumbnails.variant_formats()[-1]:
+        return render_to_string(PICTURE_TEMPLATE, {
+            'css_class': css_class,
+            'fallback': thumbnail or image,
+        })
+    fallback_srcset = sources[formats[-1]]
+    # В src — вариант, ближайший по ширине к обычной миниатюре.
+    base_width = int(settings.POSTS_THUMBNAILS[0][0].split('x')[0])
+    _, fallback = min(
+        fallback_srcset, key=lambda source: abs(source[0] - base_width)
+    )
+    return render_to_string(PICTURE_TEMPLATE, {
+        'css_class': css_class,
+        'sizes': settings.POSTS_IMAGE_SIZES,
+        'sources': [
+            (MIME_TYPES.get(image_format), sources[image_format])
+            for image_format in formats[:-1]
+        ],
+        'fallback_srcset': fallback_srcset,
+        'fallback': fallback,
+    })
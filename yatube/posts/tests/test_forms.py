@@ -1,14 +1,30 @@
+import os
 import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from django.conf import settings
-from posts.models import Group, Post, Comment
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from posts import thumbnails
+from posts.management.commands.generate_thumbnails import bounded_map
+from posts.models import Comment, Group, MediaFile, Post, ShardCheckpoint
 from posts.forms import PostForm, CommentForm
+from posts.storage import post_images
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -16,6 +32,7 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -98,7 +115,7 @@ class PostFormTest(TestCase):
                 pk=101,
                 author=self.user,
                 group=self.group,
-                image=self.post.image
+                image=SMALL_GIF_NAME
             ).exists()
         )
 
@@ -141,3 +158,408 @@ class PostFormTest(TestCase):
             'posts:post_detail', kwargs={'post_id': 100})
         )
         self.assertEqual(Comment.objects.count(), comment_count + 1)
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+SMALL_GIF_NAME = (
+    'posts/c8/b2/c8b24ca8dcbfc94990deafdb184f07dc'
+    'ed6cb8be3f70ac6562ba36d5d14b06a5.gif'
+)
+
+
+def run_on_commit(func):
+    func()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='hello')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self):
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'С картинкой',
+            'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        return Post.objects.get(text='С картинкой')
+
+    @mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+    def test_upload_generates_thumbnails(self):
+        """Миниатюры создаются при сохранении новой картинки, но не
+        при правке текста."""
+        with mock.patch('posts.thumbnails.generate') as generate:
+            post = self.create_post()
+            generate.assert_called_once_with(post.image.name)
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                data={'text': 'Новый текст'}
+            )
+            self.assertEqual(generate.call_count, 1)
+
+    def test_generate_thumbnails_command(self):
+        """Команда создаёт файлы миниатюр для всех картинок."""
+        with mock.patch('posts.signals.thumbnails.schedule'):
+            post = self.create_post()
+        out = StringIO()
+        call_command('generate_thumbnails', workers=0, stdout=out)
+        self.assertIn('обработано: 1, с ошибками: 0', out.getvalue())
+        for geometry, options in thumbnails.geometries():
+            with self.subTest(geometry=geometry, options=options):
+                self.assertTrue(thumbnails.thumbnail_file(
+                    post.image.name, geometry, options
+                ).exists())
+
+    def test_broken_image_is_reported(self):
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Битая', image='posts/missing.gif')
+        ])
+        err = StringIO()
+        call_command(
+            'generate_thumbnails', workers=0, stdout=StringIO(), stderr=err
+        )
+        self.assertIn('posts/missing.gif', err.getvalue())
+
+    def test_bounded_map_limits_pending_chunks(self):
+        """В пул отправляется не больше max_pending пачек сразу."""
+        read = []
+
+        def items():
+            for number in range(100):
+                read.append(number)
+                yield number
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            results = bounded_map(executor, list, items(), 5, 2)
+            self.assertEqual(next(results), 0)
+            self.assertLessEqual(len(read), 3 * 5)
+            self.assertEqual(sorted([0, *results]), list(range(100)))
+
+    def test_thumbnail_file_matches_sorl(self):
+        post = Post(author=self.user, text='Картинка')
+        post.image.save('small.gif', ContentFile(SMALL_GIF))
+        for geometry, options in settings.POSTS_THUMBNAILS:
+            with self.subTest(geometry=geometry):
+                self.assertEqual(
+                    thumbnails.thumbnail_file(
+                        post.image.name, geometry, options
+                    ).name,
+                    get_thumbnail(post.image, geometry, **options).name
+                )
+
+    def test_feed_loads_thumbnails_in_one_query(self):
+        """Метаданные миниатюр страницы читаются одним запросом."""
+        names = []
+        for number in range(3):
+            post = Post(author=self.user, text=f'Картинка {number}')
+            post.image.save('small.gif', ContentFile(SMALL_GIF))
+            thumbnails.generate(post.image.name)
+            names.append(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for name in names:
+            geometry, options = settings.POSTS_THUMBNAILS[0]
+            self.assertContains(
+                response,
+                thumbnails.thumbnail_file(name, geometry, options).url
+            )
+
+    def test_variant_formats_follow_pillow(self):
+        """Форматы, которые Pillow не умеет писать, пропускаются."""
+        with self.settings(
+            POSTS_IMAGE_FORMATS=('NOPE', 'JPEG'), POSTS_IMAGE_WIDTHS=(480,)
+        ):
+            self.assertEqual(thumbnails.variants(), [(
+                'JPEG', 480, '480x170',
+                {'crop': 'center', 'upscale': True, 'format': 'JPEG'},
+            )])
+
+    def test_responsive_image_srcset(self):
+        """После генерации карточка выводит srcset из всех ширин, а до
+        неё — одну миниатюру."""
+        post = Post(author=self.user, text='Картинка')
+        post.image.save('small.gif', ContentFile(SMALL_GIF))
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.assertNotContains(self.authorized_client.get(url), 'srcset')
+        thumbnails.generate(post.image.name)
+        response = self.authorized_client.get(url)
+        for image_format, width, geometry, options in thumbnails.variants():
+            with self.subTest(image_format=image_format, width=width):
+                variant = thumbnails.thumbnail_file(
+                    post.image.name, geometry, options
+                )
+                self.assertContains(response, f'{variant.url} {width}w')
+        self.assertContains(response, 'sizes="(max-width: 992px)')
+
+    def test_cached_card_gets_srcset_after_generate(self):
+        """Карточка, закешированная до генерации, выводит саму картинку,
+        не создавая миниатюр, а после генерации — srcset."""
+        post = Post(author=self.user, text='Картинка')
+        post.image.save('small.gif', ContentFile(SMALL_GIF))
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertContains(response, f'src="{post.image.url}"')
+        geometry, options = settings.POSTS_THUMBNAILS[0]
+        self.assertFalse(
+            thumbnails.thumbnail_file(post.image.name, geometry, options)
+            .exists()
+        )
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk}
+        )
+        self.assertNotContains(self.client.get(detail_url), 'srcset')
+        updated_at = Post.objects.get(pk=post.pk).updated_at
+        thumbnails.generate(post.image.name)
+        response = self.client.get(url)
+        self.assertContains(response, 'srcset')
+        self.assertNotContains(response, f'src="{post.image.url}"')
+        self.assertContains(self.client.get(detail_url), 'srcset')
+        # Пост не правился: дата изменения остаётся прежней.
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).updated_at, updated_at
+        )
+
+
+def make_jpeg(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'teal').save(buffer, 'JPEG')
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='hello')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, image):
+        return self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'С фото', 'image': image
+        })
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=500)
+    def test_large_image_is_downsized(self):
+        """Оригинал больше POSTS_IMAGE_MAX_SIDE уменьшается до записи."""
+        self.upload(make_jpeg(1600, 1000))
+        post = Post.objects.get(text='С фото')
+        with Image.open(post.image.path) as picture:
+            self.assertEqual(picture.size, (500, 312))
+            self.assertEqual(picture.format, 'JPEG')
+
+    def test_small_image_is_kept(self):
+        image = make_jpeg(300, 200)
+        content = image.read()
+        image.seek(0)
+        self.upload(image)
+        post = Post.objects.get(text='С фото')
+        with post.image.open() as stored:
+            self.assertEqual(stored.read(), content)
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        response = self.upload(make_jpeg(20, 20))
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое разрешение: 20×20.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_UPLOAD_MAX_SIZE=100)
+    def test_oversized_upload_is_dropped(self):
+        """Файл больше лимита не дочитывается, а форма сообщает о размере."""
+        response = self.upload(make_jpeg(300, 200))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Файл слишком большой: можно загрузить не больше 100\xa0байт.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='hello')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, text):
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': text,
+            'image': SimpleUploadedFile(
+                'meme.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        return Post.objects.get(text=text)
+
+    @mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+    def test_same_bytes_stored_once(self):
+        """Одинаковые загрузки — один файл и одни миниатюры на всех."""
+        with mock.patch(
+            'posts.thumbnails.generate', wraps=thumbnails.generate
+        ) as generate:
+            first = self.upload('Первый')
+            second = self.upload('Второй')
+        self.assertEqual(first.image.name, SMALL_GIF_NAME)
+        self.assertEqual(second.image.name, SMALL_GIF_NAME)
+        self.assertEqual(
+            os.listdir(
+                os.path.dirname(post_images.path(SMALL_GIF_NAME))
+            ).count(os.path.basename(SMALL_GIF_NAME)),
+            1,
+        )
+        self.assertEqual(
+            MediaFile.objects.get(name=SMALL_GIF_NAME).references, 2
+        )
+        self.assertEqual(thumbnails.generate(SMALL_GIF_NAME), 0)
+        self.assertEqual(generate.call_count, 2)
+
+    def test_concurrent_save_keeps_hashed_name(self):
+        """Если те же байты сохранили между проверкой exists и записью,
+        имя остаётся хешем, а не получает суффикс."""
+        post_images.save('posts/first.gif', ContentFile(SMALL_GIF))
+        self.addCleanup(post_images.delete, SMALL_GIF_NAME)
+        with mock.patch.object(post_images, 'exists', return_value=False):
+            name = post_images.save(
+                'posts/second.gif', ContentFile(SMALL_GIF)
+            )
+        self.assertEqual(name, SMALL_GIF_NAME)
+        self.assertEqual(
+            os.listdir(os.path.dirname(post_images.path(SMALL_GIF_NAME))),
+            [os.path.basename(SMALL_GIF_NAME)],
+        )
+
+    @mock.patch('posts.signals.media.transaction.on_commit', run_on_commit)
+    def test_file_deleted_with_last_reference(self):
+        with mock.patch('posts.signals.transaction.on_commit'):
+            first = self.upload('Первый')
+            second = self.upload('Второй')
+        thumbnails.generate(SMALL_GIF_NAME)
+        geometry, options = settings.POSTS_THUMBNAILS[0]
+        thumbnail = thumbnails.thumbnail_file(
+            SMALL_GIF_NAME, geometry, options
+        )
+        first.delete()
+        self.assertTrue(post_images.exists(SMALL_GIF_NAME))
+        second.delete()
+        self.assertFalse(post_images.exists(SMALL_GIF_NAME))
+        self.assertFalse(thumbnail.exists())
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_dedupe_media_command(self):
+        """Команда переводит старые файлы на имена по хешу и удаляет
+        дубликаты."""
+        for name in ('posts/a.gif', 'posts/b.GIF'):
+            default_storage.save(name, ContentFile(SMALL_GIF))
+        Post.objects.bulk_create([
+            Post(author=self.user, text='a', image='posts/a.gif'),
+            Post(author=self.user, text='b', image='posts/b.GIF'),
+        ])
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn(
+            'переименовано: 1, дубликатов удалено: 1', out.getvalue()
+        )
+        self.assertEqual(
+            list(Post.objects.values_list('image', flat=True)),
+            [SMALL_GIF_NAME, SMALL_GIF_NAME],
+        )
+        self.assertTrue(post_images.exists(SMALL_GIF_NAME))
+        self.assertFalse(default_storage.exists('posts/a.gif'))
+        self.assertFalse(default_storage.exists('posts/b.GIF'))
+        self.assertEqual(
+            MediaFile.objects.get(name=SMALL_GIF_NAME).references, 2
+        )
+
+    def test_shard_media_command(self):
+        """Команда переносит файлы плоского каталога в подкаталоги,
+        продолжает с сохранённой позиции и после смены раскладки
+        раскладывает файлы заново."""
+        flat_name = 'posts/' + os.path.basename(SMALL_GIF_NAME)
+        default_storage.save(flat_name, ContentFile(SMALL_GIF))
+        default_storage.save('posts/legacy.gif', ContentFile(b'GIF89a'))
+        Post.objects.bulk_create([
+            Post(author=self.user, text='a', image=flat_name),
+            Post(author=self.user, text='b', image=flat_name),
+        ])
+        out = StringIO()
+        call_command('shard_media', batch_size=1, stdout=out)
+        self.assertIn('перенесено: 1, не найдено: 0', out.getvalue())
+        self.assertEqual(
+            list(Post.objects.values_list('image', flat=True)),
+            [SMALL_GIF_NAME, SMALL_GIF_NAME],
+        )
+        self.assertTrue(post_images.exists(SMALL_GIF_NAME))
+        self.assertFalse(default_storage.exists(flat_name))
+        self.assertEqual(
+            MediaFile.objects.get(name=SMALL_GIF_NAME).references, 2
+        )
+        self.assertFalse(ShardCheckpoint.objects.exists())
+        Post.objects.bulk_create([
+            Post(author=self.user, text='c', image='posts/legacy.gif'),
+        ])
+        # Прерванный проход: посты до сохранённой позиции пропускаются.
+        ShardCheckpoint.objects.create(
+            fanout='2x2', position=Post.objects.get(text='b').pk
+        )
+        out = StringIO()
+        call_command('shard_media', stdout=out)
+        self.assertIn('Продолжение с поста', out.getvalue())
+        self.assertIn('перенесено: 1, не найдено: 0', out.getvalue())
+        name = Post.objects.get(text='c').image.name
+        self.assertRegex(name, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.gif$')
+        self.assertTrue(post_images.exists(name))
+        with self.settings(POSTS_MEDIA_FANOUT=(1, 2)):
+            out = StringIO()
+            call_command('shard_media', stdout=out)
+        self.assertNotIn('Продолжение с поста', out.getvalue())
+        self.assertIn('перенесено: 2, не найдено: 0', out.getvalue())
+        self.assertEqual(
+            Post.objects.get(text='a').image.name,
+            'posts/c8/' + os.path.basename(SMALL_GIF_NAME),
+        )
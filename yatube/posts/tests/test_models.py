@@ -1,7 +1,18 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 
-from posts.models import Group, Post, Follow, Comment
+from posts import search_index
+from posts.models import (
+    Group, MediaFile, Post, Follow, Comment, TimelineEntry, UserStats
+)
 
 
 User = get_user_model()
@@ -186,3 +197,196 @@ class FollowModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     user._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='test')
+        comment = Comment.objects.create(
+            author=self.user, post=post, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_delete_user_with_posts_and_follows(self):
+        """Удаление пользователя не создаёт заново его счётчики."""
+        author = User.objects.create_user(username='leaving')
+        follower = User.objects.create_user(username='follower')
+        Post.objects.create(author=author, text='test')
+        Follow.objects.create(user=follower, author=author)
+        Follow.objects.create(user=author, author=self.author)
+        user_ids = (author.pk, follower.pk)
+        author.delete()
+        follower.delete()
+        self.assertFalse(UserStats.objects.filter(user_id__in=user_ids))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_reconcile_counters_command(self):
+        """reconcile_counters исправляет расхождения и пустые строки."""
+        post = Post.objects.create(author=self.author, text='test')
+        Comment.objects.create(author=self.user, post=post, text='Ок')
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.filter(pk=post.pk).update(comments_count=10)
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        call_command(
+            'reconcile_counters', batch_size=1, stdout=open(os.devnull, 'w')
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+
+
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_jsonl(self, records):
+        path = os.path.join(self.directory, 'content.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            for record in records:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def import_content(self, path, **options):
+        call_command(
+            'import_content', path, stdout=open(os.devnull, 'w'), **options
+        )
+
+    def test_import_keeps_dates_and_related_data(self):
+        """Импорт сохраняет даты источника и обновляет счётчики,
+        ленты подписок и поисковый индекс."""
+        path = self.write_jsonl([
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {
+                'type': 'post', 'id': 500, 'author': 'writer',
+                'group': 'group', 'text': 'Импортированные новости',
+                'pub_date': '2015-03-01T10:00:00',
+            },
+            {'type': 'post', 'author': 'writer', 'text': 'Без даты'},
+            {
+                'type': 'comment', 'post': 500, 'author': 'reader',
+                'text': 'Старый ответ', 'created': '2015-03-02T10:00:00',
+            },
+        ])
+        self.import_content(path, batch_size=2)
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.updated_at, post.pub_date)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().created.day, 2)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        words = search_index.expand_query('новость')
+        self.assertEqual(
+            [row['post_id'] for row in search_index.ranked_posts(words)],
+            [500]
+        )
+
+    def test_import_counts_image_references(self):
+        """Импортированные посты учитываются в числе ссылок на файлы
+        картинок."""
+        name = 'posts/' + 'a' * 64 + '.gif'
+        Post.objects.create(author=self.author, text='Был', image=name)
+        path = self.write_jsonl([
+            {'author': 'writer', 'text': f'Пост {number}', 'image': name}
+            for number in range(2)
+        ])
+        self.import_content(path, type='post')
+        self.assertEqual(MediaFile.objects.get(name=name).references, 3)
+
+    def test_import_resumes_from_checkpoint(self):
+        """После ошибки повторный запуск продолжает с записанной пачки."""
+        records = [
+            {'author': 'writer', 'text': f'Пост {number}'}
+            for number in range(5)
+        ]
+        records[3]['author'] = 'nobody'
+        path = self.write_jsonl(records)
+        with self.assertRaisesMessage(CommandError, 'Запись 4'):
+            self.import_content(path, type='post', batch_size=2)
+        self.assertEqual(Post.objects.count(), 2)
+        records[3]['author'] = 'writer'
+        self.write_jsonl(records)
+        self.import_content(path, type='post', batch_size=2)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {number}' for number in range(5)]
+        )
+        self.import_content(path, type='post', batch_size=2)
+        self.assertEqual(Post.objects.count(), 5)
+
+    def test_import_csv(self):
+        """CSV с пустыми ячейками читается как отсутствующие значения."""
+        path = os.path.join(self.directory, 'posts.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(['author', 'group', 'text'])
+            writer.writerow(['writer', '', 'Пост из CSV'])
+            writer.writerow(['writer', 'group', 'Пост в группе'])
+        self.import_content(path, type='post')
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('group', flat=True)),
+            [None, self.group.pk]
+        )
+
+    def test_export_import_round_trip(self):
+        """Выгрузка export_content загружается обратно import_content."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост, с запятой'
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        path = os.path.join(self.directory, 'export.csv')
+        call_command(
+            'export_content', '--author=writer', format='csv',
+            comments=True, output=path
+        )
+        pub_date = post.pub_date
+        post.delete()
+        self.import_content(path)
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Пост, с запятой')
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments.get().text, 'Ок')
@@ -36,6 +36,7 @@ class StaticURLTests(TestCase):
             reverse('posts:index'): 200,
             reverse('about:tech'): 200,
             reverse('about:author'): 200,
+            reverse('posts:search'): 200,
             reverse('posts:post_create'): 302,
             '/unexisting_page/': 404,
         }
@@ -63,7 +64,8 @@ class StaticURLTests(TestCase):
             (reverse(
                 'posts:post_edit', kwargs={'post_id': 100}
             )): 'posts/create.html',
-            reverse('posts:post_create'): 'posts/create.html'
+            reverse('posts:post_create'): 'posts/create.html',
+            reverse('posts:search'): 'posts/search.html',
         }
         for address, template in templates_url_names.items():
             with self.subTest(address=address):
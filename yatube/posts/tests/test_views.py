@@ -1,17 +1,45 @@
+import base64
+import csv
+import json
+import os
+import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from core.middleware import QueryBudgetExceeded
+from posts import api, search_index, thumbnails, views
 from posts.forms import PostForm
-from posts.models import Post, Group, Follow, Comment
+from posts.models import Post, Group, Follow, Comment, TimelineEntry
+from posts.storage import post_images
+from posts.templatetags.post_cards import post_cards
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+# Картинки хранятся под именем SHA-256 содержимого.
+SMALL_GIF_NAME = (
+    'posts/c8/b2/c8b24ca8dcbfc94990deafdb184f07dc'
+    'ed6cb8be3f70ac6562ba36d5d14b06a5.gif'
+)
 
 User = get_user_model()
 
@@ -169,7 +197,7 @@ class PostViewsTests(TestCase):
         self.assertEqual(post_id, 100)
         self.assertEqual(text, 'Тестовый текст')
         self.assertEqual(group.title, 'Тестовая группа')
-        self.assertEqual(image.name, 'posts/small.gif')
+        self.assertEqual(image.name, SMALL_GIF_NAME)
 
     def test_profile_page_show_correct_context(self):
         """Шаблон profile сформирован с правильным контекстом."""
@@ -184,7 +212,7 @@ class PostViewsTests(TestCase):
         self.assertEqual(author.username, 'HasNoName')
         self.assertEqual(text, 'Тестовый текст')
         self.assertEqual(group.title, 'Тестовая группа')
-        self.assertEqual(image.name, 'posts/small.gif')
+        self.assertEqual(image.name, SMALL_GIF_NAME)
 
     def test_index_page_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом."""
@@ -198,7 +226,7 @@ class PostViewsTests(TestCase):
         self.assertEqual(author.username, 'HasNoName')
         self.assertEqual(text, 'Тестовый текст')
         self.assertEqual(group.title, 'Тестовая группа')
-        self.assertEqual(image.name, 'posts/small.gif')
+        self.assertEqual(image.name, SMALL_GIF_NAME)
 
     def test_group_list_page_show_correct_context(self):
         """Шаблон group_list сформирован с правильным контекстом."""
@@ -252,10 +280,14 @@ class PostViewsTests(TestCase):
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         cache_check = response.content
+        Post.objects.filter(pk=100).update(text='Текст в обход сигналов')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, cache_check)
         post = Post.objects.get(pk=100)
         post.delete()
         response = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response.content, cache_check)
+        self.assertNotEqual(response.content, cache_check)
+        self.assertNotContains(response, 'Текст в обход сигналов')
 
 
 class PaginatorViewsTest(TestCase):
@@ -282,6 +314,9 @@ class PaginatorViewsTest(TestCase):
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.author)
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator(self):
         """Тест корректности паджинатора."""
         cache.clear()
@@ -301,6 +336,827 @@ class PaginatorViewsTest(TestCase):
                 response = self.authorized_client.get(reverse_name)
                 self.assertEqual(len(response.context[page_obj]), 10)
 
+    def test_cursor_pagination(self):
+        """Переход по курсорам ?after=/?before= без пропусков и повторов."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        first_page = self.guest_client.get(url).context['page_obj']
+        response = self.guest_client.get(
+            url, {'after': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        seen = [post.pk for post in first_page] + [
+            post.pk for post in second_page
+        ]
+        self.assertEqual(len(set(seen)), self.number_of_posts)
+        response = self.guest_client.get(
+            url, {'before': second_page.previous_cursor}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in first_page]
+        )
+
+    def test_index_cache_is_page_aware(self):
+        """Кеш главной страницы хранит каждую страницу отдельно."""
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url)
+        second_page = self.guest_client.get(url, {'page': 2})
+        self.assertNotEqual(first_page.content, second_page.content)
+        self.assertContains(second_page, 'Test 0')
+        self.assertNotContains(first_page, 'Test 0<')
+
+    @override_settings(POSTS_PAGE_CACHE_TIMEOUT=0)
+    def test_feed_count_is_cached(self):
+        """Число записей ленты берётся из кеша, а не из COUNT(*)."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url)
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            self.number_of_posts
+        )
+
+    @override_settings(POSTS_PAGE_CACHE_TIMEOUT=0)
+    def test_moved_post_leaves_old_group_count(self):
+        """Перенос поста в другую группу меняет число записей обеих."""
+        other_group = Group.objects.create(
+            title='Другая группа', description='Описание', slug='other'
+        )
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        post = Post.objects.filter(group=self.group).first()
+        post.group = other_group
+        post.save()
+        response = self.guest_client.get(url)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            self.number_of_posts - 1
+        )
+
+    def test_follow_count_follows_new_and_deleted_posts(self):
+        """Число записей ленты подписок меняется с постами автора."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:follow_index')
+
+        def count():
+            return client.get(url).context['page_obj'].paginator.count
+
+        self.assertEqual(count(), self.number_of_posts)
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(count(), self.number_of_posts + 1)
+        post.delete()
+        self.assertEqual(count(), self.number_of_posts)
+
+    @override_settings(POSTS_PAGE_NUMBERS=False)
+    def test_feed_without_page_numbers(self):
+        """Без номеров страниц лента листается курсорами без COUNT(*)."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url, {'page': 2})
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+        page_obj = response.context['page_obj']
+        self.assertIsNone(page_obj.number)
+        self.assertEqual(len(page_obj), 10)
+        self.assertTrue(page_obj.has_next())
+        self.assertFalse(page_obj.has_previous())
+        self.assertNotContains(response, '?page=2')
+
+    def test_invalid_cursor_falls_back_to_page(self):
+        """Испорченный курсор открывает страницу по номеру."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': 'garbage', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_malformed_cursor_falls_back_to_page(self):
+        """Курсор с чужими типами значений не роняет страницу."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:api_posts'),
+        )
+        for values in ([1, 2], [{'a': 1}, 2], [None, None], ['', 1]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            for url in urls:
+                for param in ('after', 'before'):
+                    with self.subTest(values=values, url=url, param=param):
+                        response = self.guest_client.get(url, {param: cursor})
+                        self.assertEqual(response.status_code, 200)
+
+
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Старый текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_post(self):
+        return Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+
+    def test_card_is_cached_until_post_changes(self):
+        """Карточка берётся из кеша, пока не изменится updated_at."""
+        card, = post_cards([self.fresh_post()])
+        self.assertIn('Старый текст', card)
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        card, = post_cards([self.fresh_post()])
+        self.assertIn('Старый текст', card)
+        post = self.fresh_post()
+        post.save()
+        card, = post_cards([self.fresh_post()])
+        self.assertIn('Новый текст', card)
+
+    def test_card_variants(self):
+        """Вариант карточки для профиля не повторяет автора."""
+        feed_card, = post_cards([self.fresh_post()], 'feed')
+        profile_card, = post_cards([self.fresh_post()], 'profile')
+        self.assertIn('все посты пользователя', feed_card)
+        self.assertNotIn('все посты пользователя', profile_card)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый текст'
+        )
+        cls.other_post = Post.objects.create(
+            author=User.objects.create_user(username='other'),
+            text='Чужой текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_anonymous_pages_are_cached(self):
+        """Повторный анонимный запрос отдаётся из кеша без SQL."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    cached = self.guest_client.get(url)
+                self.assertEqual(cached.content, response.content)
+
+    def test_authorized_pages_are_not_cached(self):
+        """Авторизованные пользователи получают свежую страницу."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+
+    def test_comment_purges_only_its_post(self):
+        """Комментарий сбрасывает кеш только своего поста."""
+        post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        other_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.other_post.pk}
+        )
+        self.guest_client.get(post_url)
+        self.guest_client.get(other_url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый комментарий'}
+        )
+        self.assertContains(
+            self.guest_client.get(post_url), 'Новый комментарий'
+        )
+        with self.assertNumQueries(0):
+            self.guest_client.get(other_url)
+
+    def test_post_edit_purges_feeds(self):
+        """Правка поста сразу видна в лентах, где он показан."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.guest_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Исправленный текст', 'group': self.group.pk}
+        )
+        self.assertContains(self.guest_client.get(url), 'Исправленный текст')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_unchanged_pages_return_304(self):
+        """Совпавший ETag даёт 304, из кеша страниц — без SQL."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with self.settings(POSTS_PAGE_CACHE_TIMEOUT=0):
+                    response = self.guest_client.get(url)
+                    self.assertTrue(response.has_header('Last-Modified'))
+                    etag = response['ETag']
+                    fresh = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                    self.assertEqual(fresh.status_code, 304)
+                self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    cached = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(cached.status_code, 304)
+
+    def test_follow_index_validators(self):
+        """Лента подписок отдаёт только ETag и меняет его после подписки."""
+        url = reverse('posts:follow_index')
+        response = self.authorized_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.assertEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            304
+        )
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Новый пост')
+        Follow.objects.create(user=self.author, author=other)
+        self.assertEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            200
+        )
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый комментарий'}
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_etag_depends_on_user(self):
+        """Анонимная и авторизованная версии страницы различаются."""
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'],
+            self.authorized_client.get(url)['ETag']
+        )
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый текст'
+        )
+        cls.other_post = Post.objects.create(
+            author=User.objects.create_user(username='other'),
+            text='Чужой текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_feeds_content(self):
+        """Ленты содержат только свои посты в нужном формате."""
+        cases = (
+            ('posts:index_rss', {}, 'application/rss+xml', 2),
+            ('posts:index_atom', {}, 'application/atom+xml', 2),
+            (
+                'posts:group_rss', {'slug': 'test-slug'},
+                'application/rss+xml', 1
+            ),
+            (
+                'posts:author_atom', {'username': 'author'},
+                'application/atom+xml', 1
+            ),
+        )
+        for name, kwargs, content_type, count in cases:
+            with self.subTest(name=name):
+                response = self.guest_client.get(reverse(name, kwargs=kwargs))
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type
+                ))
+                content = response.content.decode()
+                self.assertIn('Тестовый текст', content)
+                self.assertEqual('Чужой текст' in content, count == 2)
+                self.assertIn(
+                    reverse('posts:post_detail', args=(self.post.pk,)),
+                    content
+                )
+
+    def test_author_name_in_feed(self):
+        """В записи ленты указано полное имя автора и группа."""
+        response = self.guest_client.get(
+            reverse('posts:author_rss', kwargs={'username': 'author'})
+        )
+        self.assertContains(response, 'Лев Толстой')
+        self.assertContains(response, '<category>Тестовая группа</category>')
+
+    def test_missing_object_feed_404(self):
+        urls = (
+            reverse('posts:group_rss', kwargs={'slug': 'missing'}),
+            reverse('posts:author_atom', kwargs={'username': 'missing'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.guest_client.get(url).status_code, 404)
+
+    def test_feeds_cached_and_conditional(self):
+        """Повторный опрос ленты идёт из кеша, а с ETag получает 304."""
+        url = reverse('posts:group_atom', kwargs={'slug': 'test-slug'})
+        response = self.guest_client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            cached = self.guest_client.get(url)
+        self.assertEqual(cached.content, response.content)
+        with self.assertNumQueries(0):
+            not_modified = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_post_changes_purge_feeds(self):
+        """Новый пост и правка поста сбрасывают кеш лент."""
+        rss = reverse('posts:index_rss')
+        group_rss = reverse('posts:group_rss', kwargs={'slug': 'test-slug'})
+        etag = self.guest_client.get(rss)['ETag']
+        self.guest_client.get(group_rss)
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Совсем новый пост'}
+        )
+        response = self.guest_client.get(rss, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Совсем новый пост')
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Исправленный текст', 'group': self.group.pk}
+        )
+        self.assertContains(
+            self.guest_client.get(group_rss), 'Исправленный текст'
+        )
+
+    def test_pages_link_feeds(self):
+        """Страницы лент ссылаются на свои RSS и Atom."""
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        )
+        self.assertContains(
+            response, reverse('posts:group_rss', kwargs={'slug': 'test-slug'})
+        )
+        self.assertContains(
+            response,
+            reverse('posts:group_atom', kwargs={'slug': 'test-slug'})
+        )
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+            for number in range(api.API_PAGE_SIZE + 5)
+        ]
+        cls.post = cls.posts[0]
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {number}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_posts_cursor_pagination(self):
+        """Список постов листается курсором из ссылки next."""
+        response = self.guest_client.get(reverse('posts:api_posts'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual(len(data['results']), api.API_PAGE_SIZE)
+        self.assertIsNone(data['previous'])
+        self.assertEqual(data['results'][0]['id'], self.posts[-1].pk)
+        self.assertEqual(data['results'][0]['author'], 'author')
+        self.assertEqual(data['results'][0]['group'], 'test-slug')
+        second = self.guest_client.get(data['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        self.assertEqual(second['results'][-1]['id'], self.post.pk)
+        previous = self.guest_client.get(second['previous']).json()
+        self.assertEqual(previous['results'], data['results'])
+
+    def test_sparse_fieldset(self):
+        """fields= оставляет только нужные поля и сужает SELECT."""
+        url = reverse('posts:api_posts') + '?fields=id,text'
+        with CaptureQueriesContext(connection) as queries:
+            data = self.guest_client.get(url).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        select = next(
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_post"' in query['sql']
+            and '"posts_post"."text"' in query['sql']
+        )
+        self.assertNotIn('JOIN', select)
+        self.assertNotIn('"posts_post"."image"', select)
+        second = self.guest_client.get(data['next']).json()
+        self.assertEqual(set(second['results'][0]), {'id', 'text'})
+
+    def test_unknown_field_is_error(self):
+        response = self.guest_client.get(
+            reverse('posts:api_posts') + '?fields=id,password'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_detail_resources(self):
+        """Пост, группа и профиль отдаются по своим адресам."""
+        post = self.guest_client.get(
+            reverse('posts:api_post', kwargs={'post_id': self.post.pk})
+        ).json()
+        self.assertEqual(post['text'], 'Пост 0')
+        self.assertEqual(post['comments_count'], 3)
+        self.assertIsNone(post['image'])
+        group = self.guest_client.get(
+            reverse('posts:api_group', kwargs={'slug': 'test-slug'})
+        ).json()
+        self.assertEqual(group, {
+            'slug': 'test-slug',
+            'title': 'Тестовая группа',
+            'description': 'Тестовое описание',
+        })
+        profile = self.guest_client.get(
+            reverse('posts:api_profile', kwargs={'username': 'author'})
+            + '?fields=first_name,posts_count,followers_count'
+        ).json()
+        self.assertEqual(profile, {
+            'first_name': 'Лев',
+            'posts_count': api.API_PAGE_SIZE + 5,
+            'followers_count': 1,
+        })
+
+    def test_nested_lists(self):
+        """Посты группы и автора, группы и комментарии поста."""
+        cases = (
+            (reverse('posts:api_groups'), 1),
+            (
+                reverse('posts:api_group_posts', kwargs={'slug': 'test-slug'}),
+                api.API_PAGE_SIZE,
+            ),
+            (
+                reverse(
+                    'posts:api_profile_posts', kwargs={'username': 'reader'}
+                ),
+                0,
+            ),
+            (
+                reverse(
+                    'posts:api_post_comments',
+                    kwargs={'post_id': self.post.pk}
+                ),
+                3,
+            ),
+        )
+        for url, count in cases:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), count)
+        comments = self.guest_client.get(reverse(
+            'posts:api_post_comments', kwargs={'post_id': self.post.pk}
+        )).json()['results']
+        self.assertEqual(comments[0]['text'], 'Комментарий 0')
+        self.assertEqual(comments[0]['author'], 'reader')
+
+    def test_missing_objects_404(self):
+        urls = (
+            reverse('posts:api_post', kwargs={'post_id': 10 ** 6}),
+            reverse('posts:api_post_comments', kwargs={'post_id': 10 ** 6}),
+            reverse('posts:api_group', kwargs={'slug': 'missing'}),
+            reverse('posts:api_group_posts', kwargs={'slug': 'missing'}),
+            reverse('posts:api_profile', kwargs={'username': 'missing'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+
+    def test_follow_feed(self):
+        """Лента подписок доступна только авторизованному читателю."""
+        url = reverse('posts:api_follow')
+        self.assertEqual(self.guest_client.get(url).status_code, 401)
+        data = self.authorized_client.get(url + '?fields=id,author').json()
+        self.assertEqual(
+            data['results'][0], {'id': self.posts[-1].pk, 'author': 'author'}
+        )
+        rest = self.authorized_client.get(data['next']).json()
+        self.assertEqual(
+            len(data['results']) + len(rest['results']), len(self.posts)
+        )
+
+    def test_read_only(self):
+        response = self.authorized_client.post(reverse('posts:api_posts'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_cached_and_purged(self):
+        """Ответы API кешируются и сбрасываются вместе с лентами."""
+        url = reverse('posts:api_posts')
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            not_modified = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        self.assertEqual(
+            self.guest_client.get(url).json()['results'][0]['text'],
+            'Свежий пост'
+        )
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', is_staff=True, is_superuser=True
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Кошки любят <b>молоко</b> и рыбу'
+        )
+        Post.objects.bulk_create([
+            Post(author=cls.author, text=f'Собаки любят кости {number}')
+            for number in range(12)
+        ])
+        search_index.rebuild()
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_search_finds_ranked_snippets(self):
+        """Поиск находит пост по слову и подсвечивает совпадение."""
+        response = self.client.get(reverse('posts:search'), {'q': 'молоко'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 1)
+        self.assertEqual(page_obj[0], self.post)
+        self.assertContains(response, '<mark>молоко</mark>')
+        self.assertNotContains(response, '<b>')
+
+    def test_search_is_paginated(self):
+        """Результаты поиска делятся на страницы."""
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'любят', 'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.count, 13)
+        self.assertEqual(len(response.context['page_obj']), 3)
+        # Ссылки на страницы сохраняют запрос.
+        self.assertContains(
+            response, '?q=%D0%BB%D1%8E%D0%B1%D1%8F%D1%82&amp;page=1'
+        )
+        self.assertNotContains(response, 'before=')
+
+    def test_search_results_use_post_cards(self):
+        """Результаты выводятся карточками постов со сниппетом
+        вместо текста."""
+        response = self.client.get(reverse('posts:search'), {'q': 'молоко'})
+        self.assertTemplateUsed(response, 'posts/includes/post_card.html')
+        self.assertContains(response, '<mark>молоко</mark>')
+        self.assertContains(
+            response,
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        url = reverse('posts:search')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Кошки любят сметану'
+        post.save()
+        self.assertEqual(
+            self.client.get(url, {'q': 'молоко'}).context[
+                'page_obj'
+            ].paginator.count,
+            0
+        )
+        self.assertEqual(
+            self.client.get(url, {'q': 'сметан'}).context['page_obj'][0],
+            post
+        )
+        post.delete()
+        self.assertEqual(
+            self.client.get(url, {'q': 'сметан'}).context[
+                'page_obj'
+            ].paginator.count,
+            0
+        )
+
+    def test_search_matches_word_forms(self):
+        """Поиск находит другие формы слова, начало слова и опечатки."""
+        url = reverse('posts:search')
+        for query in ('кошкам', 'кош', 'молоку', 'кошкии'):
+            with self.subTest(query=query):
+                page_obj = self.client.get(url, {'q': query}).context[
+                    'page_obj'
+                ]
+                self.assertEqual(list(page_obj), [self.post])
+
+    def test_search_finds_groups(self):
+        """По названию и описанию находятся группы."""
+        group = Group.objects.create(
+            title='Любители кошек', slug='cats', description='Про котов'
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'коты'})
+        self.assertEqual(list(response.context['groups']), [group])
+        self.assertContains(response, 'Любители кошек')
+
+    def test_operators_in_query_are_ignored(self):
+        """Синтаксис FTS5 в запросе не приводит к ошибке."""
+        for query in ('"', 'NOT', 'кошки OR (', '*', '!!!'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_search_index_command(self):
+        """Команда перестраивает индекс по существующим постам."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('delete-all')"
+            )
+        call_command('rebuild_search_index', '--optimize', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'кошки'})
+        self.assertEqual(response.context['page_obj'][0], self.post)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошк'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post]
+        )
+
+
+class ExportViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.moderator = User.objects.create_user(
+            username='moderator', is_staff=True
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Текст, с запятой'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.moderator, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.moderator_client = Client()
+        self.moderator_client.force_login(self.moderator)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_author_exports_posts_with_comments(self):
+        """Автор выгружает свои посты с комментариями в JSON Lines."""
+        response = self.author_client.get(
+            reverse('posts:profile_export', kwargs={'username': 'author'}),
+            {'comments': 1}
+        )
+        records = [
+            json.loads(line) for line in self.read(response).splitlines()
+        ]
+        self.assertEqual(
+            [(record['type'], record['text']) for record in records],
+            [('post', 'Текст, с запятой'), ('comment', 'Комментарий')]
+        )
+        self.assertEqual(records[0]['group'], 'test-slug')
+        self.assertEqual(records[1]['post'], self.post.pk)
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_group_export_as_csv(self):
+        """Модератор выгружает группу в CSV."""
+        response = self.moderator_client.get(
+            reverse('posts:group_export', kwargs={'slug': 'test-slug'}),
+            {'format': 'csv'}
+        )
+        rows = list(csv.DictReader(self.read(response).splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], 'Текст, с запятой')
+        self.assertEqual(rows[0]['author'], 'author')
+
+    def test_export_permissions(self):
+        """Чужие посты и группы может выгружать только модератор."""
+        other = User.objects.create_user(username='other')
+        other_client = Client()
+        other_client.force_login(other)
+        urls = (
+            reverse('posts:profile_export', kwargs={'username': 'author'}),
+            reverse('posts:group_export', kwargs={'slug': 'test-slug'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(other_client.get(url).status_code, 403)
+                self.assertEqual(
+                    self.moderator_client.get(url).status_code, 200
+                )
+                self.assertRedirects(
+                    Client().get(url), f'/auth/login/?next={url}'
+                )
+
 
 class FollowPagesTests(TestCase):
     @classmethod
@@ -361,6 +1217,33 @@ class FollowPagesTests(TestCase):
         post = Post.objects.get(id=self.post.pk)
         self.assertNotIn(post, response.context['page_obj'])
 
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписок заполняется при подписке и чистится при отписке."""
+        self.unfollower_client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.unfollower_user, post=self.post
+        ).exists())
+        new_post = Post.objects.create(text='Ещё тест', author=self.author)
+        response = self.unfollower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+        self.unfollower_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': self.author})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.unfollower_user
+        ).exists())
+
+    def test_rebuild_timeline_command(self):
+        """Команда rebuild_timeline восстанавливает ленты по подпискам."""
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timeline', stdout=open(os.devnull, 'w'))
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(self.post, response.context['page_obj'])
+
 
 class CommentPagesTests(TestCase):
     @classmethod
@@ -387,6 +1270,7 @@ class CommentPagesTests(TestCase):
         )
 
     def setUp(self):
+        self.guest_client = Client()
         self.authorized_client_1 = Client()
         self.authorized_client_1.force_login(self.author)
         self.authorized_client_2 = Client()
@@ -406,3 +1290,288 @@ class CommentPagesTests(TestCase):
             follow=True
         )
         self.assertEqual(Comment.objects.count(), comment_count + 1)
+
+    def create_comments(self, number):
+        Comment.objects.bulk_create([
+            Comment(
+                post=self.post, author=self.author_2, text=f'Ответ {index}'
+            )
+            for index in range(number)
+        ])
+        return list(self.post.comments.order_by('created', 'pk'))
+
+    def test_comments_are_paginated(self):
+        """Страница поста показывает первую порцию комментариев,
+        следующая приходит фрагментом по курсору."""
+        cache.clear()
+        comments = self.create_comments(views.COMMENTS_PER_PAGE + 4)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        page_obj = response.context['comments']
+        self.assertEqual(
+            list(page_obj), comments[:views.COMMENTS_PER_PAGE]
+        )
+        self.assertContains(response, 'Показать ещё')
+        with self.assertNumQueries(3):
+            fragment = self.guest_client.get(
+                reverse(
+                    'posts:post_comments', kwargs={'post_id': self.post.pk}
+                ),
+                {'after': page_obj.next_cursor}
+            )
+        self.assertTemplateNotUsed(fragment, 'base.html')
+        self.assertEqual(
+            list(fragment.context['comments']),
+            comments[views.COMMENTS_PER_PAGE:]
+        )
+        self.assertNotContains(fragment, 'Показать ещё')
+
+    def test_newest_comments_first(self):
+        """С order=new комментарии идут от новых к старым."""
+        comments = self.create_comments(3)
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'order': 'new'}
+        )
+        self.assertEqual(
+            list(response.context['comments']), comments[::-1]
+        )
+
+    def test_comments_of_missing_post(self):
+        """Фрагмент комментариев несуществующего поста — 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 999})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='media'),
+            text='Картинка',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF),
+        )
+        cls.url = reverse('media', kwargs={'path': SMALL_GIF_NAME})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_hashed_image_is_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), SMALL_GIF)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_byte_ranges(self):
+        size = len(SMALL_GIF)
+        cases = (
+            ('bytes=0-5', SMALL_GIF[:6], f'bytes 0-5/{size}'),
+            (
+                'bytes=-3', SMALL_GIF[-3:],
+                f'bytes {size - 3}-{size - 1}/{size}',
+            ),
+            ('bytes=40-', SMALL_GIF[40:], f'bytes 40-{size - 1}/{size}'),
+        )
+        for header, content, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    b''.join(response.streaming_content), content
+                )
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(
+                    response['Content-Length'], str(len(content))
+                )
+        for header in (f'bytes={size}-', 'bytes=3-1', 'bytes=-0'):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{size}')
+                # Ошибку нельзя кешировать как сам файл.
+                for name in ('Cache-Control', 'ETag', 'Accept-Ranges'):
+                    self.assertFalse(response.has_header(name))
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_access_check(self):
+        """Не отдаются файлы без постов и пути вне MEDIA_ROOT."""
+        orphan = post_images.save('posts/orphan.gif', ContentFile(b'GIF89a'))
+        for path in (orphan, '../manage.py', 'posts/../' + SMALL_GIF_NAME):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    reverse('media', kwargs={'path': path})
+                )
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(POSTS_MEDIA_SENDFILE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/' + SMALL_GIF_NAME
+        )
+        self.assertEqual(response['Content-Type'], 'image/gif')
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = []
+        for number in range(12):
+            author = User.objects.create_user(username=f'author{number}')
+            group = Group.objects.create(
+                title=f'Группа {number}',
+                description='Тестовое описание',
+                slug=f'group-{number}'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author, group=group, text=f'Пост {number}'
+            )
+            Comment.objects.create(post=post, author=author, text='Ок')
+            cls.posts.append(post)
+        cls.post = cls.posts[0]
+        for number in range(12):
+            Comment.objects.create(
+                post=cls.post, author=cls.posts[number].author, text='Ок'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_views_fit_query_budget(self):
+        """Ленты и страница поста укладываются в бюджет запросов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:follow_index'),
+            reverse('posts:group_list', kwargs={'slug': 'group-0'}),
+            reverse(
+                'posts:profile', kwargs={'username': self.post.author}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:search') + '?q=Пост',
+            reverse('posts:index_rss'),
+            reverse('posts:group_atom', kwargs={'slug': 'group-0'}),
+            reverse(
+                'posts:author_rss', kwargs={'username': self.post.author}
+            ),
+            reverse('posts:api_posts'),
+            reverse('posts:api_post', kwargs={'post_id': self.post.pk}),
+            reverse(
+                'posts:api_post_comments', kwargs={'post_id': self.post.pk}
+            ),
+            reverse('posts:api_groups'),
+            reverse('posts:api_group', kwargs={'slug': 'group-0'}),
+            reverse('posts:api_group_posts', kwargs={'slug': 'group-0'}),
+            reverse(
+                'posts:api_profile', kwargs={'username': self.post.author}
+            ),
+            reverse(
+                'posts:api_profile_posts',
+                kwargs={'username': self.post.author}
+            ),
+            reverse('posts:api_follow'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_view_over_budget_fails(self):
+        """Превышение бюджета запросов приводит к ошибке."""
+        with mock.patch.object(views.index, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.authorized_client.get(reverse('posts:index'))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_THUMBNAIL_WORKERS=0,
+    QUERY_BUDGET_RAISE=True,
+)
+class ImageQueryBudgetTests(TestCase):
+    """Бюджет запросов лент, в которых у постов есть картинки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', description='Тестовое описание', slug='images'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = []
+        for number in range(3):
+            post = Post(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+            # Разные байты — разные файлы и миниатюры у каждого поста.
+            post.image.save(
+                'small.gif', ContentFile(SMALL_GIF + bytes([number]))
+            )
+            cls.posts.append(post)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def get_all(self):
+        post = self.posts[0]
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:search') + '?q=Пост',
+        )
+        for client in (self.client, self.authorized_client):
+            for url in urls:
+                with self.subTest(url=url):
+                    cache.clear()
+                    response = client.get(url)
+                    self.assertEqual(response.status_code, 200)
+        with self.subTest(url='follow_index'):
+            response = self.authorized_client.get(
+                reverse('posts:follow_index')
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_views_fit_budget_before_thumbnails(self):
+        """Пока миниатюр нет, ленты не создают их и укладываются
+        в бюджет."""
+        self.get_all()
+
+    def test_views_fit_budget_with_thumbnails(self):
+        for post in self.posts:
+            thumbnails.generate(post.image.name)
+        self.get_all()
@@ -0,0 +1,82 @@
+"""kvstore sorl-thumbnail с пакетной загрузкой метаданных страницы.
+
+Каждый {% thumbnail %} по отдельности ищет метаданные миниатюры сначала
+в кеше, затем в таблице thumbnail_kvstore. PreloadingKVStore.preloading
+получает ключи всех миниатюр страницы одним cache.get_many и одним
+запросом key IN (...), а теги внутри блока читают их из памяти.
+"""
+import threading
+from contextlib import contextmanager
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class PreloadingKVStore(KVStore):
+    def __init__(self):
+        super().__init__()
+        # kvstore — один объект на процесс, а страницы рендерятся
+        # в разных потоках.
+        self._local = threading.local()
+
+    @property
+    def preloaded(self):
+        return getattr(self._local, 'values', None)
+
+    def load_many(self, keys):
+        """Значения ключей: из кеша, а недостающие — одним запросом
+        к базе. Отсутствующие в базе ключи кешируются как пустые, как
+        это делает _get_raw."""
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            loaded = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(loaded, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(loaded)
+        return values
+
+    @contextmanager
+    def preloading(self, image_files):
+        """Внутри блока метаданные image_files читаются из памяти.
+
+        Блоки можно вкладывать: внутренний догружает только те ключи,
+        которых ещё нет у внешнего.
+        """
+        previous = self.preloaded
+        values = dict(previous or {})
+        keys = [
+            key for key in dict.fromkeys(
+                add_prefix(image_file.key) for image_file in image_files
+            )
+            if key not in values
+        ]
+        if keys:
+            values.update(self.load_many(keys))
+        self._local.values = values
+        try:
+            yield
+        finally:
+            self._local.values = previous
+
+    def _get_raw(self, key):
+        values = self.preloaded
+        if values is None or key not in values:
+            return super()._get_raw(key)
+        value = values[key]
+        return None if value == EMPTY_VALUE else value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        if self.preloaded is not None:
+            self.preloaded[key] = value
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        if self.preloaded is not None:
+            for key in keys:
+                self.preloaded.pop(key, None)
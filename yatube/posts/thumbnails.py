@@ -0,0 +1,229 @@
+"""Генерация миниатюр картинок постов заранее, а не при первом показе.
+
+sorl-thumbnail создаёт миниатюру лениво, во время рендеринга шаблона,
+и первый посетитель страницы ждёт Pillow. Здесь все размеры из
+settings.POSTS_THUMBNAILS создаются сразу после загрузки картинки
+в пуле процессов, так что запрос не ждёт ресайза, а шаблон потом
+находит готовую миниатюру в kvstore. preload загружает метаданные
+миниатюр целой страницы одним запросом. Закешированные карточки
+и страницы постов с этой картинкой после генерации устаревают.
+
+Вместе с миниатюрами создаются адаптивные варианты для srcset: ширины
+POSTS_IMAGE_WIDTHS в форматах POSTS_IMAGE_FORMATS с пропорциями первой
+миниатюры из POSTS_THUMBNAILS.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+
+import django
+from django.conf import settings
+from django.db import connections
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .storage import post_images
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def init_worker():
+    """Готовит процесс пула: Django настроен, соединения с базой свои."""
+    django.setup()
+    # Соединения, унаследованные от родителя при fork, использовать
+    # нельзя: процесс откроет свои при первом запросе.
+    connections.close_all()
+
+
+def variant_formats():
+    """Форматы из POSTS_IMAGE_FORMATS, которые умеет писать Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POSTS_IMAGE_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def variants():
+    """Адаптивные варианты: (формат, ширина, геометрия, опции)."""
+    geometry, options = settings.POSTS_THUMBNAILS[0]
+    width, height = (int(side) for side in geometry.split('x'))
+    return [
+        (
+            image_format,
+            variant_width,
+            f'{variant_width}x{round(variant_width * height / width)}',
+            {**options, 'format': image_format},
+        )
+        for image_format in variant_formats()
+        for variant_width in settings.POSTS_IMAGE_WIDTHS
+    ]
+
+
+def geometries():
+    """Все пары (геометрия, опции), которые создаются для картинки."""
+    return list(settings.POSTS_THUMBNAILS) + [
+        (geometry, options) for _, _, geometry, options in variants()
+    ]
+
+
+def generate(name):
+    """Создаёт недостающие миниатюры и варианты картинки name;
+    возвращает число созданных.
+
+    Делает то же, что get_thumbnail для каждого размера, но исходник
+    декодируется один раз на все размеры.
+    """
+    # sorl-thumbnail на отсутствующий файл только пишет в лог.
+    if not post_images.exists(name):
+        raise FileNotFoundError(name)
+    kvstore = default.kvstore
+    missing = {}
+    for geometry, options in geometries():
+        options = thumbnail_options(name, options)
+        thumbnail = thumbnail_file(name, geometry, options)
+        if thumbnail.name not in missing and not kvstore.get(thumbnail):
+            missing[thumbnail.name] = geometry, options, thumbnail
+    if not missing:
+        return 0
+    # Файл миниатюры без записи в kvstore остаётся, например, от другой
+    # загрузки тех же байтов: как и get_thumbnail, он не пересоздаётся,
+    # иначе хранилище сохранило бы копию под другим именем.
+    create = [
+        item for item in missing.values() if not item[2].exists()
+    ]
+    source = source_file(name)
+    if create:
+        engine = default.engine
+        source_image = engine.get_image(source)
+        try:
+            source.set_size(engine.get_image_size(source_image))
+            image_info = engine.get_image_info(source_image)
+            for geometry, options, thumbnail in create:
+                default.backend._create_thumbnail(
+                    source_image,
+                    geometry,
+                    {**options, 'image_info': image_info},
+                    thumbnail,
+                )
+        finally:
+            engine.cleanup(source_image)
+    kvstore.get_or_set(source)
+    for _, _, thumbnail in missing.values():
+        kvstore.set(thumbnail, source)
+    # Карточки и страницы, отрендеренные без этих миниатюр, выводят
+    # одну картинку без srcset: они рендерятся заново. updated_at постов
+    # не меняется — сами посты не правились.
+    caching.purge_tags(caching.media_tag(name))
+    caching.bump_feed_generation()
+    return len(create)
+
+
+def generate_safe(name):
+    """generate для пула: ошибка одной картинки не роняет обработку
+    остальных. Возвращает пару (имя, текст ошибки или None)."""
+    try:
+        generate(name)
+    except Exception as error:
+        return name, f'{type(error).__name__}: {error}'
+    return name, None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+            initializer=init_worker,
+        )
+    return _executor
+
+
+def _report(name, error):
+    if error is not None:
+        logger.warning('Миниатюры %s не созданы: %s', name, error)
+
+
+def schedule(name):
+    """Ставит генерацию миниатюр name в фоновый пул.
+
+    При POSTS_THUMBNAIL_WORKERS = 0 миниатюры создаются сразу.
+    """
+    global _executor
+    if not name:
+        return
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        _report(*generate_safe(name))
+        return
+    try:
+        future = get_executor().submit(generate_safe, name)
+    except BrokenProcessPool:
+        # Процесс пула погиб (например, от нехватки памяти):
+        # пул пересоздаётся, задача не теряется.
+        _executor = None
+        future = get_executor().submit(generate_safe, name)
+    future.add_done_callback(lambda done: _report(*done.result()))
+
+
+def source_file(name):
+    """ImageFile картинки поста.
+
+    Ключи миниатюр в kvstore включают класс хранилища исходника, поэтому
+    он тот же, что у поля Post.image и {% thumbnail post.image %}.
+    """
+    return ImageFile(name, post_images)
+
+
+def delete(name):
+    """Удаляет файлы миниатюр и вариантов картинки name и их записи
+    в kvstore; сам исходник не трогает."""
+    default.kvstore.delete(source_file(name))
+
+
+def thumbnail_options(name, options):
+    """Опции миниатюры с умолчаниями sorl-thumbnail.
+
+    Повторяет разбор опций из начала ThumbnailBackend.get_thumbnail,
+    чтобы имя и ключ совпали с теми, что ищет {% thumbnail %}.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source_file(name)))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(name, geometry, options):
+    """ImageFile миниатюры без обращения к хранилищу и kvstore."""
+    return ImageFile(
+        default.backend._get_thumbnail_filename(
+            source_file(name), geometry, thumbnail_options(name, options)
+        ),
+        default.storage,
+    )
+
+
+def preload(names):
+    """Контекст, в котором миниатюры и варианты картинок names берут
+    метаданные из одной пачки."""
+    files = [
+        thumbnail_file(name, geometry, options)
+        for name in dict.fromkeys(filter(None, names))
+        for geometry, options in geometries()
+    ]
+    if not files or not hasattr(default.kvstore, 'preloading'):
+        return nullcontext()
+    return default.kvstore.preloading(files)
@@ -0,0 +1,115 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Пост раскладывается по лентам подписчиков в момент публикации,
+поэтому follow_index читает одну таблицу по индексу (user, pub_date).
+"""
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def _bulk_insert(entries, batch_size=BATCH_SIZE):
+    # bulk_create превращает аргумент в список, поэтому поток записей
+    # режется на пачки заранее, чтобы не держать всю ленту в памяти.
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def followers(author_id):
+    """id подписчиков автора: в их лентах есть его посты."""
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора;
+    возвращает их id."""
+    user_ids = followers(post.author_id)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+    )
+    return user_ids
+
+
+def fan_out_many(posts):
+    """fan_out для пачки постов: подписчики всех авторов читаются
+    одним запросом. Возвращает id подписчиков, чьи ленты изменились."""
+    author_ids = {post.author_id for post in posts}
+    followers = {}
+    for author_id, user_id in Follow.objects.filter(
+        author_id__in=author_ids
+    ).values_list('author_id', 'user_id').iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for post in posts
+        for user_id in followers.get(post.author_id, ())
+    )
+    return {
+        user_id for user_ids in followers.values() for user_id in user_ids
+    }
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date').iterator()
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Полностью пересобирает ленты по текущим подпискам."""
+    rows = Post.objects.filter(
+        author__following__isnull=False
+    ).values_list(
+        'author__following__user_id', 'pk', 'author_id', 'pub_date'
+    ).iterator()
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        _bulk_insert(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id, post_id, author_id, pub_date in rows
+            ),
+            batch_size=batch_size,
+        )
+    return TimelineEntry.objects.count()
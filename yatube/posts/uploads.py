@@ -0,0 +1,139 @@
+"""Приём картинок постов с ограниченным расходом памяти.
+
+Загрузка пишется на диск потоком (маленькие файлы остаются в памяти,
+большие уходят во временный файл), а файл больше POSTS_UPLOAD_MAX_SIZE
+отбрасывается, не дочитываясь до конца. Формат и размеры картинки
+проверяются по заголовку, без декодирования пикселей, а слишком большие
+оригиналы уменьшаются до POSTS_IMAGE_MAX_SIDE ещё до записи
+в MEDIA_ROOT/posts/: JPEG декодируется сразу в уменьшенном масштабе
+(draft), остальное уменьшается целочисленным reduce перед ресайзом.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Во сколько раз уменьшать быстрым reduce до точного ресайза:
+# чем больше, тем качественнее и медленнее.
+REDUCING_GAP = 3.0
+JPEG_QUALITY = 90
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """Первый обработчик загрузки: пропускает данные дальше и отбрасывает
+    файл, как только он превысит POSTS_UPLOAD_MAX_SIZE.
+
+    Поля отброшенных файлов запоминаются в request.oversized_uploads,
+    чтобы форма показала ошибку, а не «обязательное поле».
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.field_name = field_name
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POSTS_UPLOAD_MAX_SIZE:
+            oversized = getattr(self.request, 'oversized_uploads', set())
+            oversized.add(self.field_name)
+            self.request.oversized_uploads = oversized
+            raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def oversized_error():
+    return ValidationError(
+        'Файл слишком большой: можно загрузить не больше %(limit)s.',
+        code='file_too_large',
+        params={'limit': filesizeformat(settings.POSTS_UPLOAD_MAX_SIZE)},
+    )
+
+
+def prepare_image(upload):
+    """Проверяет загруженную картинку и при необходимости уменьшает её.
+
+    Возвращает upload без изменений или новый временный файл
+    с уменьшенной картинкой в том же формате.
+    """
+    upload.seek(0)
+    try:
+        picture = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Слишком большое разрешение.', code='image_too_large'
+        )
+    with picture:
+        if picture.format not in ALLOWED_FORMATS:
+            raise ValidationError(
+                'Поддерживаются только JPEG, PNG, GIF и WebP.',
+                code='invalid_image_format',
+            )
+        width, height = picture.size
+        if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Слишком большое разрешение: %(width)s×%(height)s.',
+                code='image_too_large',
+                params={'width': width, 'height': height},
+            )
+        max_side = settings.POSTS_IMAGE_MAX_SIDE
+        if (max(width, height) <= max_side
+                or getattr(picture, 'is_animated', False)):
+            upload.seek(0)
+            return upload
+        return downsize(picture, upload, max_side)
+
+
+def downsize(picture, upload, max_side):
+    """Уменьшает картинку так, чтобы большая сторона была max_side."""
+    image_format = picture.format
+    exif = picture.info.get('exif')
+    scale = max_side / max(picture.size)
+    target = (
+        max(1, round(picture.width * scale)),
+        max(1, round(picture.height * scale)),
+    )
+    # draft выбирает для JPEG масштаб декодирования 1/2–1/8, при котором
+    # картинка ещё не меньше нужной: полноразмерный растр в память не
+    # попадает. Дальше resize уменьшает целочисленным reduce и только
+    # остаток досчитывает фильтром LANCZOS.
+    picture.draft(None, target)
+    picture = picture.resize(
+        target, Image.LANCZOS, reducing_gap=REDUCING_GAP
+    )
+    options = {'format': image_format}
+    if image_format == 'JPEG':
+        options.update(quality=JPEG_QUALITY, optimize=True)
+    if exif and image_format in ('JPEG', 'WEBP'):
+        # Поворот из EXIF применяется при показе, поэтому он сохраняется.
+        options['exif'] = exif
+    # Небольшой результат остаётся в памяти, большой уходит на диск,
+    # как и сама загрузка.
+    spooled = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+        dir=settings.FILE_UPLOAD_TEMP_DIR,
+    )
+    picture.save(spooled, **options)
+    size = spooled.tell()
+    spooled.seek(0)
+    return UploadedFile(
+        spooled,
+        os.path.basename(upload.name),
+        Image.MIME.get(image_format, upload.content_type),
+        size,
+    )
+
+
+def clean_image(image):
+    """Для clean_image формы: новую загрузку проверяет и уменьшает,
+    уже сохранённый файл оставляет как есть."""
+    if isinstance(image, UploadedFile):
+        return prepare_image(image)
+    return image
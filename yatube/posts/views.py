@@ -1,33 +1,103 @@
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 
-from .models import Post, Group, User, Follow
+from core.decorators import query_budget
+
+from .models import Comment, Post, Group, User, Follow, TimelineEntry
+from . import conditional, exporter
+from .caching import (
+    anonymous_page_cache, count_key, feed_generation, tag_posts,
+    tag_request
+)
+from .counters import get_user_stats
 from .forms import PostForm, CommentForm
+from .paginators import CursorPaginator
+from .search import SearchResults
 
 VIEW_RECORDS = 10
+INDEX_CACHE_TIMEOUT = 60 * 60 * 3
+GROUP_RESULTS = 5
+COMMENTS_PER_PAGE = 20
+COMMENT_ORDERINGS = {
+    'old': ('created', 'pk'),
+    'new': ('-created', '-pk'),
+}
+
+
+def get_page_obj(request, posts, **kwargs):
+    paginator = CursorPaginator(
+        posts,
+        VIEW_RECORDS,
+        page_numbers=settings.POSTS_PAGE_NUMBERS,
+        **kwargs
+    )
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
 
+def get_comments_page(request, post_id):
+    """Страница комментариев поста по курсору ?after= вместе с авторами."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = 'old'
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_PER_PAGE,
+        ordering=COMMENT_ORDERINGS[order],
+        page_numbers=False,
+    )
+    page_obj = paginator.get_page(after=request.GET.get('after'))
+    page_obj.order = order
+    return page_obj
+
+
+def page_key(request, page_obj):
+    """Идентификатор открытой страницы ленты для ключей кеша."""
+    return ':'.join((
+        str(page_obj.number or ''),
+        request.GET.get('after', ''),
+        request.GET.get('before', ''),
+    ))
 
+
+@query_budget(6)
+@anonymous_page_cache
+@conditional.conditional_view(conditional.index_state)
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, VIEW_RECORDS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = get_page_obj(request, posts, count_key=count_key('index'))
+    tag_request(request, 'feed')
+    tag_posts(request, page_obj)
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
         'title': 'Последние обновления на сайте',
+        'cache_timeout': INDEX_CACHE_TIMEOUT,
+        'feed_generation': feed_generation(),
+        'page_key': page_key(request, page_obj),
     }
     return render(request, template, context)
 
 
+@query_budget(8)
+@anonymous_page_cache
+@conditional.conditional_view(conditional.group_state)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, VIEW_RECORDS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = get_page_obj(
+        request, posts, count_key=count_key('group', group.pk)
+    )
+    tag_request(request, f'group:{group.pk}')
+    tag_posts(request, page_obj)
     template = 'posts/group_list.html'
     context = {
         'group': group,
@@ -37,33 +107,45 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(9)
+@anonymous_page_cache
+@conditional.conditional_view(conditional.profile_state)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author
         ).exists()
     else:
         following = False
-    post_list = author.posts.all()
-    num_of_posts = post_list.count()
-    paginator = Paginator(post_list, VIEW_RECORDS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    stats = get_user_stats(author)
+    post_list = author.posts.select_related('author', 'group')
+    page_obj = get_page_obj(request, post_list, count=stats.posts_count)
+    tag_request(request, f'author:{author.pk}')
+    tag_posts(request, page_obj)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'num_of_posts': num_of_posts,
+        'num_of_posts': stats.posts_count,
+        'stats': stats,
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(7)
+@anonymous_page_cache
+@conditional.conditional_view(conditional.post_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    tag_posts(request, [post])
+    post_count = get_user_stats(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = get_comments_page(request, post.pk)
     context = {
         'post': post,
         'post_count': post_count,
@@ -73,9 +155,84 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(6)
+@anonymous_page_cache
+@conditional.conditional_view(conditional.post_state)
+def post_comments(request, post_id):
+    """Следующая порция комментариев: HTML-фрагмент для «Показать ещё»."""
+    comments = get_comments_page(request, post_id)
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    tag_request(request, f'post:{post_id}')
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(9)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = SearchResults(
+        Post.objects.select_related('author', 'group'), query
+    )
+    page_obj = Paginator(results, VIEW_RECORDS).get_page(
+        request.GET.get('page')
+    )
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+        'groups': results.groups()[:GROUP_RESULTS],
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def export_response(request, posts, name):
+    """Потоковая выгрузка постов: ?format=jsonl|csv, ?comments=1."""
+    data_format = request.GET.get('format', 'jsonl')
+    if data_format not in exporter.FORMATS:
+        data_format = 'jsonl'
+    response = StreamingHttpResponse(
+        exporter.export(
+            posts, data_format, comments=bool(request.GET.get('comments'))
+        ),
+        content_type=exporter.FORMATS[data_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{data_format}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(
+        request, Post.objects.filter(author=author), f'posts-{username}'
+    )
+
+
+@login_required
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(
+        request, Post.objects.filter(group=group), f'group-{slug}'
+    )
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        oversized=getattr(request, 'oversized_uploads', ()),
+    )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
@@ -98,7 +255,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized=getattr(request, 'oversized_uploads', ()),
     )
     if form.is_valid():
         form.save()
@@ -122,12 +280,20 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(6)
 @login_required
+@conditional.conditional_view(conditional.follow_state)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, VIEW_RECORDS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    entries = TimelineEntry.objects.filter(
+        user=request.user
+    ).select_related('post__author', 'post__group')
+    page_obj = get_page_obj(
+        request,
+        entries,
+        ordering=('-pub_date', '-post_id'),
+        count_key=count_key('follow', request.user.pk),
+    )
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
     context = {
         'page_obj': page_obj,
         'title': 'Подписки на авторов',
@@ -32,8 +32,64 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
+# Превышение бюджета запросов (@query_budget) только пишется в лог;
+# в тестах включается выбрасывание исключения.
+QUERY_BUDGET_RAISE = False
+
+# manage.py test запускается с QUERY_BUDGET_RAISE = True и своим
+# временным файлом кеша.
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# False — ленты листаются только кнопками «Предыдущая»/«Следующая»
+# по курсорам, без номеров страниц и подсчёта COUNT(*).
+POSTS_PAGE_NUMBERS = True
+
+# Время жизни полностраничного кеша лент и постов для анонимов;
+# 0 отключает кеш. Устаревшие страницы сбрасываются по тегам сразу.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Миниатюры, которые шаблоны запрашивают через {% thumbnail %}: они
+# создаются сразу после загрузки картинки, а не при первом показе.
+POSTS_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Адаптивные варианты картинки поста для srcset: ширины с пропорциями
+# первой миниатюры и форматы в порядке предпочтения. Последний формат —
+# запасной для <img>; форматы, которые не умеет писать Pillow, пропускаются.
+POSTS_IMAGE_WIDTHS = (480, 720, 960, 1440)
+POSTS_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POSTS_IMAGE_SIZES = '(max-width: 992px) 100vw, 960px'
+# Загрузка картинок: файл больше POSTS_UPLOAD_MAX_SIZE отбрасывается
+# при приёме, картинка больше POSTS_IMAGE_MAX_PIXELS отклоняется по
+# заголовку, а большая сторона длиннее POSTS_IMAGE_MAX_SIDE уменьшается
+# до записи в MEDIA_ROOT.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.UploadSizeLimitHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POSTS_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 60_000_000
+POSTS_IMAGE_MAX_SIDE = 2560
+# Картинки постов лежат в подкаталогах из первых символов хеша
+# содержимого: (число уровней, символов на уровень). (2, 2) — 65 536
+# каталогов; после изменения файлы переносит команда shard_media.
+POSTS_MEDIA_FANOUT = (2, 2)
+# Кто передаёт файлы MEDIA_ROOT при DEBUG = False (posts.serving):
+# None — сам Django, 'x-accel-redirect' — nginx из internal-location
+# POSTS_MEDIA_ACCEL_PREFIX, 'x-sendfile' — Apache или lighttpd.
+POSTS_MEDIA_SENDFILE = None
+POSTS_MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Число процессов фонового пула миниатюр; 0 — создавать их сразу
+# в процессе, сохранившем картинку.
+POSTS_THUMBNAIL_WORKERS = 2
+# kvstore sorl-thumbnail, загружающий метаданные миниатюр страницы
+# пачкой (posts.thumbnails.preload).
+THUMBNAIL_KVSTORE = 'posts.thumbnail_kvstore.PreloadingKVStore'
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
@@ -94,6 +150,10 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 STATIC_URL = '/static/'
+# collectstatic пишет сюда файлы с хешами в именах и их копии .gz/.br;
+# при DEBUG = False их отдаёт core.staticfiles.serve_static.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -104,9 +164,20 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех воркеров хоста кеш в файле SQLite (WAL). Путь
+# к файлу задаёт переменная окружения YATUBE_CACHE_LOCATION, по умолчанию
+# — каталог cache проекта. Файл не должен лежать в общем каталоге вроде
+# /tmp: бэкенд распаковывает pickle из него.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': '127.0.0.1:11211',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
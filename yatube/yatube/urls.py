@@ -1,9 +1,14 @@
+import re
+
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.staticfiles import serve_static
+from posts.serving import serve_media
+
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
@@ -21,3 +26,16 @@ if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )
+else:
+    urlpatterns += [
+        re_path(
+            rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$',
+            serve_media,
+            name='media',
+        ),
+        re_path(
+            rf'^{re.escape(settings.STATIC_URL.lstrip("/"))}(?P<path>.+)$',
+            serve_static,
+            name='static',
+        ),
+    ]